@@ -0,0 +1,222 @@
+"""
+Offline batch jobs against the provider's asynchronous batch API.
+
+A job renders every prompt for a dataset into a batch JSONL file, submits it
+through a transport, polls until the provider has written the output file, and
+ingests the output back into the same result dicts the live pipeline produces.
+
+Each request line carries a stable custom_id derived from the task, the item's
+position and a hash of its text, so re-rendering the same dataset produces the
+same ids. A manifest written next to the batch file maps ids back to the
+original inputs.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+
+CHAT_COMPLETIONS_URL = "/v1/chat/completions"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+def make_custom_id(task, index, text):
+    digest = hashlib.sha1(text.encode('utf-8')).hexdigest()[:10]
+    return f"{task}-{index:06d}-{digest}"
+
+def _write_jsonl(records, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    os.replace(tmp_path, path)
+
+def _read_jsonl(path):
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+def manifest_path_for(batch_path):
+    return os.path.splitext(batch_path)[0] + ".manifest.jsonl"
+
+def render_nl_to_sql_batch(data, batch_path, converter):
+    """Render one chat completion request per NL query into a batch file"""
+    groq_client = converter.groq_client
+    requests, manifest = [], []
+    for index, item in enumerate(data):
+        nl_query = item.get("nl_query", "")
+        custom_id = make_custom_id("generate", index, nl_query)
+        prompt, system_prompt = groq_client.build_nl_to_sql_prompt(nl_query, converter.schema_info)
+        requests.append({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": CHAT_COMPLETIONS_URL,
+            "body": groq_client.build_request_body(prompt, system_prompt)
+        })
+        manifest.append({"custom_id": custom_id, "index": index, "natural_language_query": nl_query})
+
+    _write_jsonl(requests, batch_path)
+    _write_jsonl(manifest, manifest_path_for(batch_path))
+    return len(requests)
+
+def render_sql_correction_batch(data, batch_path, corrector):
+    """
+    Render one chat completion request per incorrect query into a batch file.
+
+    The error message for each query is collected now, as in the live
+    pipeline, and kept in the manifest for the results.
+    """
+    groq_client = corrector.groq_client
+    requests, manifest = [], []
+    for index, item in enumerate(data):
+        incorrect_sql = item.get("incorrect_sql", "")
+        custom_id = make_custom_id("correct", index, incorrect_sql)
+        error_message = corrector.get_error_message(incorrect_sql)
+        prompt, system_prompt = groq_client.build_sql_correction_prompt(
+            incorrect_sql, corrector.schema_info, error_message
+        )
+        requests.append({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": CHAT_COMPLETIONS_URL,
+            "body": groq_client.build_request_body(prompt, system_prompt)
+        })
+        manifest.append({
+            "custom_id": custom_id,
+            "index": index,
+            "incorrect_sql": incorrect_sql,
+            "error_message": error_message
+        })
+
+    _write_jsonl(requests, batch_path)
+    _write_jsonl(manifest, manifest_path_for(batch_path))
+    return len(requests)
+
+def _response_content(record):
+    """Pull the completion text out of one batch output line, or raise with the error"""
+    if record.get("error"):
+        raise RuntimeError(str(record["error"]))
+    response = record.get("response") or {}
+    if response.get("status_code", 200) != 200:
+        raise RuntimeError(f"Request failed with status {response.get('status_code')}: {response.get('body')}")
+    return response["body"]["choices"][0]["message"]["content"]
+
+def ingest_batch_output(output_path, batch_path, task, extract_sql):
+    """
+    Turn a batch output file back into pipeline results, in input order.
+
+    Items with no output line or a failed request get an "error" entry instead
+    of SQL, so the results line up one-to-one with the dataset.
+    """
+    manifest = _read_jsonl(manifest_path_for(batch_path))
+    outputs = {record["custom_id"]: record for record in _read_jsonl(output_path)}
+    sql_field = "generated_sql" if task == "generate" else "corrected_sql"
+
+    results = []
+    for entry in sorted(manifest, key=lambda entry: entry["index"]):
+        result = {key: value for key, value in entry.items() if key not in ("custom_id", "index")}
+        record = outputs.get(entry["custom_id"])
+        try:
+            if record is None:
+                raise RuntimeError("No output for this request")
+            result[sql_field] = extract_sql(_response_content(record))
+        except Exception as e:
+            result[sql_field] = None
+            result["error"] = str(e)
+        results.append(result)
+    return results
+
+class GroqBatchTransport:
+    """Submits batch files to the Groq batch API"""
+
+    def __init__(self, groq_client, completion_window="24h"):
+        self.groq_client = groq_client
+        self.completion_window = completion_window
+
+    def submit(self, batch_path):
+        client = self.groq_client.client
+        with open(batch_path, 'rb') as f:
+            uploaded = client.files.create(file=f, purpose="batch")
+        batch = client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=CHAT_COMPLETIONS_URL,
+            completion_window=self.completion_window
+        )
+        return batch.id
+
+    def status(self, batch_id):
+        return self.groq_client.client.batches.retrieve(batch_id).status
+
+    def download(self, batch_id, output_path):
+        batch = self.groq_client.client.batches.retrieve(batch_id)
+        if not batch.output_file_id:
+            raise RuntimeError(f"Batch {batch_id} has no output file (status: {batch.status})")
+        self.groq_client.client.files.content(batch.output_file_id).write_to_file(output_path)
+
+class LocalBatchTransport:
+    """
+    File-based stand-in for the batch API.
+
+    Submitted files are copied into a directory. A batch is completed once
+    ``<batch_id>.output.jsonl`` exists there, either dropped in by a test or
+    produced by ``respond``, a callable taking a request body and returning
+    the completion text.
+    """
+
+    def __init__(self, directory, respond=None):
+        self.directory = directory
+        self.respond = respond
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, batch_id, kind):
+        return os.path.join(self.directory, f"{batch_id}.{kind}.jsonl")
+
+    def submit(self, batch_path):
+        with open(batch_path, 'rb') as f:
+            batch_id = "local-" + hashlib.sha1(f.read()).hexdigest()[:16]
+        shutil.copyfile(batch_path, self._path(batch_id, "input"))
+        return batch_id
+
+    def _process(self, batch_id):
+        records = []
+        for request in _read_jsonl(self._path(batch_id, "input")):
+            record = {"id": f"{batch_id}-{request['custom_id']}", "custom_id": request["custom_id"], "error": None}
+            try:
+                content = self.respond(request["body"])
+                record["response"] = {
+                    "status_code": 200,
+                    "body": {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]}
+                }
+            except Exception as e:
+                record["response"] = None
+                record["error"] = {"message": str(e)}
+            records.append(record)
+        _write_jsonl(records, self._path(batch_id, "output"))
+
+    def status(self, batch_id):
+        if not os.path.exists(self._path(batch_id, "input")):
+            raise RuntimeError(f"Unknown batch {batch_id}")
+        if os.path.exists(self._path(batch_id, "output")):
+            return "completed"
+        if self.respond:
+            self._process(batch_id)
+            return "completed"
+        return "in_progress"
+
+    def download(self, batch_id, output_path):
+        shutil.copyfile(self._path(batch_id, "output"), output_path)
+
+def wait_for_batch(transport, batch_id, poll_interval=60, timeout=None):
+    """Poll a batch until it reaches a terminal status and return that status"""
+    start_time = time.time()
+    while True:
+        status = transport.status(batch_id)
+        print(f"Batch {batch_id}: {status}")
+        if status in TERMINAL_STATUSES:
+            return status
+        if timeout is not None and time.time() - start_time > timeout:
+            raise TimeoutError(f"Batch {batch_id} did not finish within {timeout} seconds")
+        time.sleep(poll_interval)
@@ -0,0 +1,188 @@
+"""
+Post-generation cost guard.
+
+Runs EXPLAIN (FORMAT JSON) on generated SQL, which plans the statement
+without executing it, and flags plans that would be expensive on
+production-sized tables: sequential scans of large relations, nested loops
+with huge row estimates and joins with no join predicate. Flagged queries can
+optionally be sent back to the LLM, with the plan summary attached, for a
+cheaper equivalent.
+"""
+
+import re
+import json
+from database import get_database
+from sandbox import split_statements
+
+SELECT_STAR_PATTERN = re.compile(r'\bselect\s+(?:distinct\s+)?(?:\w+\.)?\*', re.IGNORECASE)
+JOIN_CONDITION_KEYS = ("Join Filter", "Index Cond", "Recheck Cond", "Hash Cond", "Merge Cond")
+
+def _walk(plan, depth=0):
+    yield plan, depth
+    for child in plan.get("Plans", []):
+        yield from _walk(child, depth + 1)
+
+def _has_condition(plan):
+    return any(key in node for node, _ in _walk(plan) for key in JOIN_CONDITION_KEYS)
+
+def explain_query(sql_query, db=None):
+    """
+    Return the root plan node and the estimated size of every relation it scans.
+
+    Raises RuntimeError if the statement cannot be planned, or if the text
+    holds more than one statement: psycopg2 would run every statement after
+    the first instead of explaining it.
+    """
+    statements = split_statements(sql_query)
+    if len(statements) != 1:
+        raise RuntimeError(f"Could not explain query: expected one statement, got {len(statements)}")
+    db = get_database(db)
+    conn = db.get_connection()
+    if not conn:
+        raise RuntimeError("Failed to connect to database")
+
+    try:
+        cursor = conn.cursor()
+        # The server refuses any write, should one ever get past the check above
+        cursor.execute("SET TRANSACTION READ ONLY")
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {statements[0]}")
+        explain_output = cursor.fetchone()[0]
+        # psycopg2 decodes json columns, but not on every server version
+        if isinstance(explain_output, str):
+            explain_output = json.loads(explain_output)
+        plan = explain_output[0]["Plan"]
+
+        relations = sorted({node["Relation Name"] for node, _ in _walk(plan) if "Relation Name" in node})
+        cursor.execute(
+            "SELECT relname, reltuples FROM pg_class WHERE relname = ANY(%s) AND relkind IN ('r', 'm', 'p')",
+            (relations,)
+        )
+        relation_rows = {name: float(rows) for name, rows in cursor.fetchall()}
+        return plan, relation_rows
+    except Exception as e:
+        raise RuntimeError(f"Could not explain query: {e}") from e
+    finally:
+        cursor.close()
+        # EXPLAIN without ANALYZE never executes, and nothing is committed
+        db.release_connection(conn)
+
+class CostGuard:
+    """
+    Flags expensive plans for generated SQL and optionally asks for cheaper rewrites.
+
+    Args:
+        max_total_cost: Planner cost above which a query is flagged as expensive
+        large_table_rows: Sequential scans of relations with at least this many
+            estimated rows are flagged
+        nested_loop_rows: Nested loops estimated to produce at least this many
+            rows are flagged
+        cross_join_rows: Joins without a join predicate are flagged once they
+            are estimated to produce at least this many rows
+        rewrite: Ask the LLM for a cheaper equivalent when a query is flagged
+    """
+
+    def __init__(self, max_total_cost=100000.0, large_table_rows=100000,
+                 nested_loop_rows=1000000, rewrite=False, cross_join_rows=10000):
+        self.max_total_cost = max_total_cost
+        self.large_table_rows = large_table_rows
+        self.nested_loop_rows = nested_loop_rows
+        self.cross_join_rows = cross_join_rows
+        self.rewrite = rewrite
+
+    def analyze_plan(self, plan, relation_rows):
+        """Return a list of human-readable flags for a plan"""
+        flags = []
+        if plan.get("Total Cost", 0) > self.max_total_cost:
+            flags.append(f"high_cost: estimated cost {plan['Total Cost']:.0f} exceeds {self.max_total_cost:.0f}")
+
+        for node, _ in _walk(plan):
+            node_type = node.get("Node Type")
+            if node_type == "Seq Scan":
+                relation = node.get("Relation Name")
+                rows = relation_rows.get(relation, 0)
+                if rows >= self.large_table_rows:
+                    flags.append(f"seq_scan: sequential scan on {relation} (~{rows:.0f} rows)")
+            elif node_type == "Nested Loop":
+                rows = node.get("Plan Rows", 0)
+                if rows >= self.nested_loop_rows:
+                    flags.append(f"nested_loop: nested loop producing ~{rows:.0f} rows")
+                children = node.get("Plans", [])
+                # A nested loop whose inner side has no condition at all is a
+                # cross join; joining against a handful of rows is harmless
+                if ("Join Filter" not in node and len(children) == 2 and not _has_condition(children[1])
+                        and rows >= self.cross_join_rows):
+                    flags.append(f"missing_join_predicate: cartesian product of ~{rows:.0f} rows")
+        return flags
+
+    def summarize_plan(self, plan, max_nodes=20):
+        """Compact, indented one-line-per-node summary for inclusion in a prompt"""
+        lines = []
+        for node, depth in _walk(plan):
+            if len(lines) >= max_nodes:
+                lines.append("  ...")
+                break
+            description = node.get("Node Type", "?")
+            if "Relation Name" in node:
+                description += f" on {node['Relation Name']}"
+            for key in ("Index Name", "Join Filter", "Hash Cond", "Index Cond", "Filter"):
+                if key in node:
+                    description += f" [{key}: {node[key]}]"
+            lines.append(f"{'  ' * depth}{description} (cost={node.get('Total Cost', 0):.0f} rows={node.get('Plan Rows', 0):.0f})")
+        return "\n".join(lines)
+
+    def review(self, sql_query, db=None):
+        """Plan a query and return its estimated cost and any flags"""
+        review = {"estimated_cost": None, "cost_flags": []}
+        if SELECT_STAR_PATTERN.search(sql_query):
+            review["cost_flags"].append("select_star: selects every column")
+        try:
+            plan, relation_rows = explain_query(sql_query, db)
+        except RuntimeError as e:
+            review["cost_error"] = str(e)
+            return review
+
+        review["estimated_cost"] = plan.get("Total Cost")
+        review["estimated_rows"] = plan.get("Plan Rows")
+        review["cost_flags"] += self.analyze_plan(plan, relation_rows)
+        review["plan_summary"] = self.summarize_plan(plan)
+        return review
+
+    def guard(self, sql_query, groq_client=None, schema_info=None, extract_sql=None, db=None):
+        """
+        Review a query and, if rewriting is enabled and it was flagged, try a
+        cheaper equivalent from the LLM. The rewrite is only kept when its
+        estimated cost is lower.
+
+        Returns:
+            dict: The review of the query that should be used, with "sql" set
+                  to that query, plus "original_sql" and "original_estimated_cost"
+                  when a rewrite was accepted
+        """
+        review = self.review(sql_query, db)
+        review["sql"] = sql_query
+        plan_flags = [flag for flag in review["cost_flags"] if not flag.startswith("select_star")]
+        if not (self.rewrite and groq_client and review["estimated_cost"] is not None and review["cost_flags"]):
+            return review
+
+        try:
+            raw_response = groq_client.get_cost_rewrite_completion(
+                sql_query, schema_info, review["plan_summary"], review["cost_flags"]
+            )
+        except RuntimeError as e:
+            review["rewrite_error"] = str(e)
+            return review
+        candidate_sql = extract_sql(raw_response) if extract_sql else raw_response
+
+        candidate = self.review(candidate_sql, db)
+        cheaper = candidate["estimated_cost"] is not None and candidate["estimated_cost"] < review["estimated_cost"]
+        # Dropping SELECT * alone does not change the estimate, so accept an equal-cost rewrite then
+        if not cheaper and not plan_flags and candidate["estimated_cost"] == review["estimated_cost"]:
+            cheaper = not any(flag.startswith("select_star") for flag in candidate["cost_flags"])
+        if not cheaper:
+            review["rewrite_rejected"] = candidate_sql
+            return review
+
+        candidate["sql"] = candidate_sql
+        candidate["original_sql"] = sql_query
+        candidate["original_estimated_cost"] = review["estimated_cost"]
+        return candidate
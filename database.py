@@ -1,6 +1,10 @@
-import psycopg2
-import pandas as pd
-from psycopg2 import sql
+import re
+import time
+import threading
+from collections import OrderedDict
+
+# psycopg2 and pandas are imported where they are used so that importing this
+# module, and every entry point built on it, stays cheap until a query runs.
 
 DB_CONFIG = {
     'host': 'localhost',
@@ -10,20 +14,296 @@ DB_CONFIG = {
     'port': '5432'
 }
 
-def get_connection():
-    try:
-        return psycopg2.connect(**DB_CONFIG)
-    except Exception as e:
-        print(f"Error connecting to database: {e}")
-        return None
+class Database:
+    """
+    A database target with its own connection pool and schema cache.
+
+    Give either a DSN string or a psycopg2 connection config dict. Unpooled
+    handles open a fresh connection per call, which is what the command-line
+    tools do; pooled handles block when all ``maxconn`` connections are in use.
+    """
+
+    def __init__(self, dsn=None, config=None, minconn=1, maxconn=10, pooled=True):
+        self.dsn = dsn
+        self.config = config if config is not None else {}
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.pooled = pooled
+
+        self._pool = None
+        self._slots = None
+        self._checked_out = {}
+        self._lock = threading.Lock()
+        self.active = 0
+        self.last_used = time.monotonic()
+
+        # Set by TenantRegistry for the handles it owns
+        self.registry = None
+        self.evicted = False
+
+        # Filled in by schema_extractor
+        self.schema_prompt = None
+        self.schema_lock = threading.Lock()
+
+    @property
+    def key(self):
+        """Identifies the target, without the password"""
+        if self.dsn:
+            masked = re.sub(r'(password\s*=\s*)\S+', r'\1***', self.dsn)
+            return re.sub(r'(://[^:/@]+:)[^@]+@', r'\1***@', masked)
+        return "{user}@{host}:{port}/{database}".format(**{k: self.config.get(k, '') for k in ('user', 'host', 'port', 'database')})
+
+    def _connect(self):
+        import psycopg2
+
+        if self.dsn:
+            return psycopg2.connect(self.dsn)
+        return psycopg2.connect(**self.config)
+
+    def init_pool(self, minconn=None, maxconn=None):
+        from psycopg2 import pool
+
+        with self._lock:
+            self.pooled = True
+            self.minconn = minconn or self.minconn
+            self.maxconn = maxconn or self.maxconn
+            if self._pool is None:
+                try:
+                    if self.dsn:
+                        self._pool = pool.ThreadedConnectionPool(self.minconn, self.maxconn, self.dsn)
+                    else:
+                        self._pool = pool.ThreadedConnectionPool(self.minconn, self.maxconn, **self.config)
+                    self._slots = threading.BoundedSemaphore(self.maxconn)
+                except Exception as e:
+                    print(f"Error creating connection pool for {self.key}: {e}")
+                    return False
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+                self._slots = None
+
+    def close_if_unused(self):
+        """Close the pool of an evicted handle once no connection is checked out"""
+        with self._lock:
+            if not self.evicted or self.active:
+                return
+            connection_pool, self._pool, self._slots = self._pool, None, None
+        if connection_pool is not None:
+            connection_pool.closeall()
+
+    def get_connection(self):
+        with self._lock:
+            # Counted before checkout so the registry cannot evict the handle meanwhile
+            self.active += 1
+            self.last_used = time.monotonic()
+        if self.evicted and self.registry is not None:
+            self.registry.readmit(self)
+
+        try:
+            # An evicted handle that could not be readmitted must not open a
+            # pool nobody would close, so it falls back to a one-off connection
+            if self.pooled and not self.evicted and (self._pool is not None or self.init_pool()):
+                slots, connection_pool = self._slots, self._pool
+                slots.acquire()
+                try:
+                    conn = connection_pool.getconn()
+                except Exception:
+                    slots.release()
+                    raise
+            else:
+                slots, conn = None, self._connect()
+        except Exception as e:
+            print(f"Error connecting to database: {e}")
+            with self._lock:
+                self.active -= 1
+            self.close_if_unused()
+            return None
+
+        if slots is not None:
+            with self._lock:
+                self._checked_out[id(conn)] = slots
+        return conn
+
+    def release_connection(self, conn):
+        """Return a connection to the pool, or close it when no pool is in use"""
+        from psycopg2 import pool
+
+        with self._lock:
+            slots = self._checked_out.pop(id(conn), None)
+
+        try:
+            if slots is None:
+                conn.close()
+                return
+            try:
+                # Never hand out a connection with an open transaction
+                if not conn.closed:
+                    conn.rollback()
+                if self._pool is not None:
+                    self._pool.putconn(conn, close=bool(conn.closed))
+                else:
+                    conn.close()
+            except pool.PoolError:
+                conn.close()
+            finally:
+                slots.release()
+        finally:
+            # Still counted as active until the connection is back, so an
+            # evicted handle's pool is not closed underneath it
+            with self._lock:
+                self.active -= 1
+                self.last_used = time.monotonic()
+            self.close_if_unused()
+
+class TenantRegistry:
+    """
+    Bounded registry of per-tenant Database handles, keyed by DSN.
+
+    At most ``max_tenants`` handles are kept. The least recently used idle
+    handles are evicted first, and so is any handle idle for longer than
+    ``idle_timeout`` seconds. Eviction closes the tenant's pool and drops its
+    schema cache. Handles with connections checked out are never evicted,
+    so the limit can be exceeded briefly under load. A handle that a caller
+    resolved just before it was evicted is readmitted on its next checkout
+    rather than quietly reopening a pool the registry no longer tracks.
+    """
+
+    def __init__(self, max_tenants=32, idle_timeout=600, pool_size=5):
+        self.max_tenants = max_tenants
+        self.idle_timeout = idle_timeout
+        self.pool_size = pool_size
+        self._tenants = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, dsn):
+        with self._lock:
+            db = self._tenants.get(dsn)
+            if db is None:
+                db = Database(dsn=dsn, maxconn=self.pool_size)
+                db.registry = self
+                self._tenants[dsn] = db
+            else:
+                self._tenants.move_to_end(dsn)
+            db.last_used = time.monotonic()
+            evicted = self._collect_evictions()
+        for old_db in evicted:
+            old_db.close_if_unused()
+        return db
+
+    def readmit(self, db):
+        """
+        Put an evicted handle back, for a caller that resolved it just before
+        it was evicted. If a new handle already took its place, the old one
+        stays evicted and only hands out one-off connections.
+        """
+        with self._lock:
+            if self._tenants.get(db.dsn) is None:
+                self._tenants[db.dsn] = db
+                with db._lock:
+                    db.evicted = False
+
+    def _collect_evictions(self):
+        """Pick handles to evict. Caller must hold the lock."""
+        now = time.monotonic()
+        evicted = []
+        for dsn, db in list(self._tenants.items()):
+            over_limit = len(self._tenants) > self.max_tenants
+            idle_too_long = now - db.last_used > self.idle_timeout
+            if not (over_limit or idle_too_long):
+                continue
+            # Checked and marked under the handle's lock, so a checkout that
+            # has already counted itself active keeps the handle alive
+            with db._lock:
+                if db.active:
+                    continue
+                db.evicted = True
+            evicted.append(self._tenants.pop(dsn))
+        return evicted
+
+    def evict_idle(self):
+        with self._lock:
+            evicted = self._collect_evictions()
+        for db in evicted:
+            db.close_if_unused()
+        return len(evicted)
+
+    def close_all(self):
+        with self._lock:
+            tenants = list(self._tenants.values())
+            self._tenants.clear()
+        for db in tenants:
+            db.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tenants": len(self._tenants),
+                "active_connections": sum(db.active for db in self._tenants.values())
+            }
+
+# The database configured above; unpooled unless init_pool is called
+default_database = Database(config=DB_CONFIG, pooled=False)
+tenants = TenantRegistry()
+
+def configure_tenants(max_tenants=32, idle_timeout=600, pool_size=5):
+    """Replace the tenant registry, closing every pool held by the old one"""
+    global tenants
+    old_tenants = tenants
+    tenants = TenantRegistry(max_tenants, idle_timeout, pool_size)
+    old_tenants.close_all()
+    return tenants
+
+def get_database(db=None):
+    """Resolve None (the default database), a DSN string or a Database handle"""
+    if db is None:
+        return default_database
+    if isinstance(db, Database):
+        return db
+    return tenants.get(db)
+
+def init_pool(minconn=1, maxconn=10):
+    """
+    Create a shared connection pool for long-running processes.
+
+    Once initialized, get_connection hands out pooled connections and
+    release_connection returns them instead of closing them.
+    """
+    return default_database.init_pool(minconn, maxconn)
+
+def close_pool():
+    default_database.close()
+    default_database.pooled = False
+    tenants.close_all()
+
+def get_connection(db=None):
+    return get_database(db).get_connection()
+
+def release_connection(conn, db=None):
+    get_database(db).release_connection(conn)
+
+def execute_query(query, fetch=True, db=None, read_only=False):
+    """
+    Run a query and return its rows as a DataFrame, or a status message.
+
+    With read_only=True the query runs in a READ ONLY transaction, so the
+    server refuses any write it attempts.
+    """
+    import psycopg2
+    import pandas as pd
 
-def execute_query(query, fetch=True):
-    conn = get_connection()
+    db = get_database(db)
+    conn = db.get_connection()
     if not conn:
         return "Failed to connect to database"
     
     try:
         cursor = conn.cursor()
+        if read_only:
+            cursor.execute("SET TRANSACTION READ ONLY")
         cursor.execute(query)
         
         if fetch:
@@ -44,10 +324,11 @@ def execute_query(query, fetch=True):
     
     finally:
         cursor.close()
-        conn.close()
+        db.release_connection(conn)
 
-def test_connection():
-    conn = get_connection()
+def test_connection(db=None):
+    db = get_database(db)
+    conn = db.get_connection()
     if not conn:
         return "Failed to connect to database"
     
@@ -72,7 +353,7 @@ def test_connection():
     
     finally:
         cursor.close()
-        conn.close()
+        db.release_connection(conn)
 
 if __name__ == "__main__":
     test_connection()
@@ -1,9 +1,13 @@
 import os
 import json
 import argparse
-from tqdm import tqdm
+from groq_client import GroqClient
 from nl_to_sql import NLtoSQLConverter
 from sql_corrector import SQLCorrector
+from query_cache import QueryCache, SQLiteQueryCache, scoped_key
+from worker_pool import process_in_order
+
+cache = QueryCache()
 
 def load_json_data(file_path):
     """Load JSON data from a file"""
@@ -14,90 +18,157 @@ def load_json_data(file_path):
         print(f"Error loading data from {file_path}: {e}")
         return []
 
-def save_json_data(data, file_path):
-    """Save data to a JSON file"""
-    try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
-        print(f"Results saved to {file_path}")
-    except Exception as e:
-        print(f"Error saving results to {file_path}: {e}")
+def load_existing_results(file_path):
+    """
+    Load the items of a previous output file.
 
-def process_nl_to_sql_data(input_file, output_file):
-    """Process the NL to SQL data"""
-    print(f"Processing NL to SQL data from {input_file}")
-    
-    # Load data
+    The file is written incrementally, so an interrupted run leaves a JSON
+    array with no closing bracket and possibly a half-written last item.
+    Every complete item before that point is returned.
+    """
+    if not os.path.exists(file_path):
+        return []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    decoder = json.JSONDecoder()
+    items = []
+    position = text.find('[') + 1
+    if position == 0:
+        return []
+    while True:
+        while position < len(text) and text[position] in ' \t\r\n,':
+            position += 1
+        if position >= len(text) or text[position] == ']':
+            break
+        try:
+            item, position = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            break
+        items.append(item)
+    return items
+
+class JSONArrayWriter:
+    """
+    Writes a JSON array one item at a time, flushing after each item.
+
+    Items go to file_path + ".tmp", which replaces file_path only once the
+    array is complete, so an interrupted run never loses the previous output.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.tmp_path = file_path + ".tmp"
+        self.count = 0
+        self._file = open(self.tmp_path, 'w', encoding='utf-8')
+        self._file.write("[")
+
+    def write(self, item):
+        separator = ",\n" if self.count else "\n"
+        rendered = json.dumps(item, indent=2).replace("\n", "\n  ")
+        self._file.write(f"{separator}  {rendered}")
+        self._file.flush()
+        self.count += 1
+
+    def close(self, complete=True):
+        """Finish the array; only a complete array replaces file_path"""
+        self._file.write("\n]\n" if self.count else "]\n")
+        self._file.close()
+        if complete:
+            os.replace(self.tmp_path, self.file_path)
+
+def generate_sql(args):
+    converter, nl_query = args
+    key = scoped_key(converter, nl_query)
+    cached_result = cache.get_nl_to_sql(key)
+    if cached_result:
+        return cached_result
+    result = converter.nl_to_sql(nl_query, execute=False)
+    cache.set_nl_to_sql(key, result)
+    return result
+
+def correct_sql(args):
+    corrector, incorrect_sql = args
+    key = scoped_key(corrector, incorrect_sql)
+    cached_result = cache.get_sql_correction(key)
+    if cached_result:
+        return cached_result
+    result = corrector.correct_sql(incorrect_sql, execute=False)
+    cache.set_sql_correction(key, result)
+    return result
+
+def process_training_data(input_file, output_file, input_field, reference_field, output_fields, run, max_workers):
+    """
+    Run one task over a training file and write the output in input order.
+
+    Items already present in output_file, or in the .tmp file of an
+    interrupted run, matched on their input and reference query, are copied
+    over instead of being processed again. Failed items are left out, so a
+    rerun retries them.
+    """
     train_data = load_json_data(input_file)
     if not train_data:
         print("No training data found. Exiting.")
         return
-    
-    # Initialize converter
-    converter = NLtoSQLConverter()
-    
-    # Process each NL query
-    results = []
-    
-    for item in tqdm(train_data, desc="Processing NL queries"):
-        nl_query = item.get("NL", "")
-        if not nl_query:
-            continue
-        
-        # Generate SQL from NL
-        result = converter.nl_to_sql(nl_query, execute=False)
-        
-        # Create output item
-        output_item = {
-            "nl_query": nl_query,
-            "generated_sql": result["generated_sql"],
-            "reference_sql": item.get("Query", "")  # Include reference SQL if available
-        }
-        
-        results.append(output_item)
-    
-    # Save results
-    save_json_data(results, output_file)
-    print(f"Processed {len(results)} NL queries")
-
-def process_sql_correction_data(input_file, output_file):
+
+    input_key, sql_key = output_fields
+    existing = {(item.get(input_key), item.get("reference_sql")): item
+                for path in (output_file, output_file + ".tmp")
+                for item in load_existing_results(path)}
+    items = [(item.get(input_field, ""), item.get(reference_field, "")) for item in train_data]
+    items = [item for item in items if item[0]]
+    todo = [item for item in items if item not in existing]
+    if os.path.exists(output_file + ".tmp"):
+        # Fold the items of an interrupted run into the output first, since
+        # the writer below starts a new .tmp file
+        recovered = JSONArrayWriter(output_file)
+        for item in items:
+            if item in existing:
+                recovered.write(existing[item])
+        recovered.close()
+    print(f"{len(items) - len(todo)} items already in {output_file}, {len(todo)} to process")
+
+    results = process_in_order(todo, run, max_workers)
+    writer = JSONArrayWriter(output_file)
+    failed = 0
+    complete = False
+    try:
+        for item in items:
+            if item in existing:
+                writer.write(existing[item])
+                continue
+            # Items come back in the same order they are listed in todo
+            _, result = next(results)
+            if isinstance(result, Exception):
+                print(f"Processing {item[0][:60]!r} generated an exception: {result}")
+                failed += 1
+                continue
+            writer.write({input_key: item[0], sql_key: result[sql_key], "reference_sql": item[1]})
+        complete = True
+    finally:
+        writer.close(complete)
+    print(f"Results saved to {output_file}")
+    print(f"Wrote {writer.count} items ({failed} failed)")
+
+def process_nl_to_sql_data(input_file, output_file, converter, max_workers=4):
+    """Process the NL to SQL data"""
+    print(f"Processing NL to SQL data from {input_file}")
+    process_training_data(
+        input_file, output_file, "NL", "Query", ("nl_query", "generated_sql"),
+        lambda item: generate_sql((converter, item[0])), max_workers
+    )
+
+def process_sql_correction_data(input_file, output_file, corrector, max_workers=4):
     """Process the SQL correction data"""
     print(f"Processing SQL correction data from {input_file}")
-    
-    # Load data
-    train_data = load_json_data(input_file)
-    if not train_data:
-        print("No training data found. Exiting.")
-        return
-    
-    # Initialize corrector
-    corrector = SQLCorrector()
-    
-    # Process each incorrect SQL query
-    results = []
-    
-    for item in tqdm(train_data, desc="Processing incorrect SQL queries"):
-        incorrect_sql = item.get("IncorrectQuery", "")
-        if not incorrect_sql:
-            continue
-        
-        # Correct SQL
-        result = corrector.correct_sql(incorrect_sql, execute=False)
-        
-        # Create output item
-        output_item = {
-            "incorrect_sql": incorrect_sql,
-            "corrected_sql": result["corrected_sql"],
-            "reference_sql": item.get("CorrectQuery", "")  # Include reference SQL if available
-        }
-        
-        results.append(output_item)
-    
-    # Save results
-    save_json_data(results, output_file)
-    print(f"Processed {len(results)} SQL queries")
+    process_training_data(
+        input_file, output_file, "IncorrectQuery", "CorrectQuery", ("incorrect_sql", "corrected_sql"),
+        lambda item: correct_sql((corrector, item[0])), max_workers
+    )
 
 def main():
+    global cache
+
     parser = argparse.ArgumentParser(description='Process NL-to-SQL and SQL correction training data')
     parser.add_argument('--nl-input', type=str, default='train_generate_task.json',
                       help='Path to NL to SQL training data JSON file')
@@ -109,15 +180,32 @@ def main():
                       help='Path to output file for SQL correction results')
     parser.add_argument('--task', type=str, choices=['generate', 'correct', 'both'], default='both',
                       help='Task to perform: generate (NL to SQL), correct (SQL correction), or both')
-    
+    parser.add_argument('--max-workers', type=int, default=4,
+                      help='Maximum number of concurrent LLM requests')
+    parser.add_argument('--database', type=str, default=None,
+                      help='DSN of the database to use instead of the one in database.DB_CONFIG')
+    parser.add_argument('--cache-db', type=str, default=None,
+                      help='SQLite file for a query cache shared with main.py and across runs')
+
     args = parser.parse_args()
-    
+    if args.cache_db:
+        cache = SQLiteQueryCache(args.cache_db)
+
+    # One client for both tasks; the schema prompt is cached per database
+    try:
+        client = GroqClient()
+    except Exception as e:
+        print(f"Groq client initialization failed: {e}")
+        return
+
     # Process tasks based on argument
     if args.task in ['generate', 'both']:
-        process_nl_to_sql_data(args.nl_input, args.nl_output)
-    
+        converter = NLtoSQLConverter(client, db=args.database)
+        process_nl_to_sql_data(args.nl_input, args.nl_output, converter, args.max_workers)
+
     if args.task in ['correct', 'both']:
-        process_sql_correction_data(args.sql_input, args.sql_output)
+        corrector = SQLCorrector(client, db=args.database)
+        process_sql_correction_data(args.sql_input, args.sql_output, corrector, args.max_workers)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
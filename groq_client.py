@@ -1,13 +1,34 @@
 import os
-from groq import Groq
+import time
+import threading
+
+class RateLimiter:
+    """Thread-safe limiter that spaces requests evenly to stay under a per-minute rate"""
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
 
 class GroqClient:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, rate_limiter=None):
+        self.rate_limiter = rate_limiter
         self.api_key = api_key or os.getenv("GROQ_API_KEY")
         if not self.api_key:
             raise ValueError("API key must be provided or set as an environment variable (GROQ_API_KEY).")
 
-        self.client = Groq(api_key=self.api_key)
+        # The groq SDK is imported and the HTTP client built on first use
+        self._client = None
+        self._client_lock = threading.Lock()
 
         self.models = {
             "llama3-8b": "llama3-8b-8192",
@@ -17,39 +38,90 @@ class GroqClient:
         }
         self.default_model = self.models.get("llama3-8b")
 
-    def get_completion(self, prompt, system_prompt=None, model=None, temperature=0.1, max_tokens=1024):
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from groq import Groq
+                    self._client = Groq(api_key=self.api_key)
+        return self._client
+
+    def check_api_key(self):
+        """Validate the API key by listing models, which costs no tokens"""
+        try:
+            self.client.models.list()
+            return True
+        except Exception as e:
+            raise RuntimeError(f"Groq API error: {str(e)}") from e
+
+    def build_request_body(self, prompt, system_prompt=None, model=None, temperature=0.1, max_tokens=1024):
+        """Build the chat completion request body, shared by live and batch requests"""
         messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
         messages.append({"role": "user", "content": prompt})
+        return {
+            "messages": messages,
+            "model": model or self.default_model,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+
+    def get_completion(self, prompt, system_prompt=None, model=None, temperature=0.1, max_tokens=1024):
+        body = self.build_request_body(prompt, system_prompt, model, temperature, max_tokens)
+
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
 
         try:
-            response = self.client.chat.completions.create(
-                messages=messages,
-                model=model or self.default_model,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
+            response = self.client.chat.completions.create(**body)
             return response.choices[0].message.content
 
         except Exception as e:
             raise RuntimeError(f"Groq API error: {str(e)}") from e
 
-    def get_nl_to_sql_completion(self, nl_query, schema_info, temperature=0.1):
+    def build_nl_to_sql_prompt(self, nl_query, schema_info):
+        """Return the (prompt, system_prompt) pair for NL to SQL generation"""
         system_prompt = self._common_system_prompt("SQL")
         prompt = f"{schema_info}\n\nNatural Language Query: {nl_query}\n\nGenerate the SQL query:"
-        return self.get_completion(prompt, system_prompt, temperature=temperature)
+        return prompt, system_prompt
 
-    def get_sql_correction_completion(self, incorrect_sql, schema_info, error_message=None, temperature=0.1):
+    def build_sql_correction_prompt(self, incorrect_sql, schema_info, error_message=None):
+        """Return the (prompt, system_prompt) pair for SQL correction"""
         system_prompt = self._common_system_prompt("debug")
         prompt = f"{schema_info}\n\nIncorrect SQL Query:\n```sql\n{incorrect_sql}\n```"
         if error_message:
             prompt += f"\n\nError Message: {error_message}"
         prompt += "\n\nCorrected SQL Query:"
+        return prompt, system_prompt
+
+    def build_cost_rewrite_prompt(self, sql_query, schema_info, plan_summary, cost_flags):
+        """Return the (prompt, system_prompt) pair for rewriting an expensive query"""
+        system_prompt = self._common_system_prompt("optimize")
+        flags = "\n".join(f"- {flag}" for flag in cost_flags)
+        prompt = (
+            f"{schema_info}\n\nSQL Query:\n```sql\n{sql_query}\n```"
+            f"\n\nQuery Plan:\n{plan_summary}\n\nProblems:\n{flags}"
+            "\n\nRewrite the query to return the same results at a lower cost:"
+        )
+        return prompt, system_prompt
+
+    def get_nl_to_sql_completion(self, nl_query, schema_info, temperature=0.1):
+        prompt, system_prompt = self.build_nl_to_sql_prompt(nl_query, schema_info)
+        return self.get_completion(prompt, system_prompt, temperature=temperature)
+
+    def get_sql_correction_completion(self, incorrect_sql, schema_info, error_message=None, temperature=0.1):
+        prompt, system_prompt = self.build_sql_correction_prompt(incorrect_sql, schema_info, error_message)
+        return self.get_completion(prompt, system_prompt, temperature=temperature)
+
+    def get_cost_rewrite_completion(self, sql_query, schema_info, plan_summary, cost_flags, temperature=0.1):
+        prompt, system_prompt = self.build_cost_rewrite_prompt(sql_query, schema_info, plan_summary, cost_flags)
         return self.get_completion(prompt, system_prompt, temperature=temperature)
 
     def _common_system_prompt(self, mode):
         prompts = {
             "SQL": "You are an expert SQL query generator. Generate only SQL code with proper formatting, optimized for PostgreSQL.",
-            "debug": "You are an expert SQL debugger. Fix errors in SQL queries efficiently for PostgreSQL, without explanations."
+            "debug": "You are an expert SQL debugger. Fix errors in SQL queries efficiently for PostgreSQL, without explanations.",
+            "optimize": "You are an expert PostgreSQL performance tuner. Rewrite SQL queries into cheaper equivalents that return the same results, without explanations."
         }
         return prompts.get(mode, "")
 
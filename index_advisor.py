@@ -0,0 +1,622 @@
+"""
+Workload-driven index advisor.
+
+Reads a workload of SQL statements (a results CSV, a JSON dataset or a .sql
+file), extracts the filter, join, group-by and order-by columns each query
+uses per table, and proposes single- and multi-column indexes ranked by
+estimated benefit.
+
+Benefit comes from one of two sources:
+  - HypoPG, when --database points at a server with the hypopg extension:
+    queries are planned with EXPLAIN before and after creating each
+    hypothetical index.
+  - A local cost model otherwise, using reltuples from the database when
+    available, or a default table size. Equality selectivity comes from
+    pg_stats.n_distinct, or from the column types, enum labels and CHECK
+    (... IN ...) lists of the CREATE TABLE script, so a boolean flag is
+    never mistaken for a selective column.
+
+Indexes are picked greedily: each round adds the candidate with the largest
+benefit on top of the indexes already picked, so near-duplicates of a chosen
+index add nothing and are left out.
+
+Columns are extracted with regular expressions rather than a full SQL parser,
+so unusual syntax may be missed. Missed columns only mean fewer candidates,
+never wrong DDL.
+"""
+
+import os
+import re
+import csv
+import json
+import math
+import hashlib
+import argparse
+from collections import defaultdict
+from database import get_database
+from result_cache import normalize_sql
+from sandbox import split_statements
+
+IDENTIFIER = r'[a-z_][a-z0-9_$]*'
+COLUMN_REF = rf'(?:{IDENTIFIER}\.)?{IDENTIFIER}'
+OPERAND = rf'{COLUMN_REF}|\?|-?\d+(?:\.\d+)?'
+
+COMPARISON_PATTERN = re.compile(rf'({OPERAND})\s*(=|<>|!=|<=|>=|<|>)\s*({OPERAND})')
+KEYWORD_PREDICATE_PATTERN = re.compile(rf'({COLUMN_REF})\s+(not\s+)?(in|like|ilike|between|is)\b')
+STRING_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'")
+RELATION_PATTERN = re.compile(rf'\b(from|join)\s+({IDENTIFIER}(?:\.{IDENTIFIER})?)(?:\s+(?:as\s+)?({IDENTIFIER}))?')
+FROM_LIST_PATTERN = re.compile(r'\bfrom\s+(.+?)(?=\bwhere\b|\bgroup\s+by\b|\border\s+by\b|\bhaving\b|\blimit\b|\bunion\b|\b(?:inner|left|right|full|cross)?\s*join\b|\)|$)')
+
+CLAUSE_END = r'(?=\bgroup\s+by\b|\border\s+by\b|\bhaving\b|\blimit\b|\boffset\b|\bunion\b|\bwhere\b|\b(?:inner|left|right|full|cross)?\s*join\b|\)\s*(?:as\s+)?' + IDENTIFIER + r'|$)'
+WHERE_PATTERN = re.compile(r'\bwhere\b(.*?)' + CLAUSE_END)
+ON_PATTERN = re.compile(r'\bon\b(.*?)' + CLAUSE_END)
+GROUP_BY_PATTERN = re.compile(r'\bgroup\s+by\b(.*?)(?=\bhaving\b|\border\s+by\b|\blimit\b|\bunion\b|\)|$)')
+ORDER_BY_PATTERN = re.compile(r'\border\s+by\b(.*?)(?=\blimit\b|\boffset\b|\bunion\b|\)|$)')
+
+# Words the alias and column patterns must never treat as names
+SQL_KEYWORDS = {
+    'select', 'from', 'where', 'join', 'inner', 'left', 'right', 'full', 'outer', 'cross',
+    'on', 'and', 'or', 'not', 'in', 'is', 'null', 'true', 'false', 'like', 'ilike', 'between',
+    'group', 'by', 'order', 'having', 'limit', 'offset', 'union', 'all', 'as', 'asc', 'desc',
+    'distinct', 'case', 'when', 'then', 'else', 'end', 'with', 'using', 'natural', 'lateral',
+    'current_date', 'current_timestamp', 'now', 'interval', 'exists', 'any', 'some', 'nulls',
+    'first', 'last', 'set', 'values', 'returning'
+}
+
+EQUALITY_OPERATORS = {'=', 'in', 'is'}
+RANGE_OPERATORS = {'<', '>', '<=', '>=', 'between', 'like', 'ilike'}
+
+# Local cost model, in PostgreSQL planner units
+ROWS_PER_PAGE = 100
+INDEX_ROWS_PER_PAGE = 300
+SEQ_PAGE_COST = 1.0
+RANDOM_PAGE_COST = 4.0
+CPU_TUPLE_COST = 0.01
+CPU_INDEX_TUPLE_COST = 0.005
+CPU_OPERATOR_COST = 0.0025
+# Used for columns with no statistics and no telling type
+EQUALITY_SELECTIVITY = 0.005
+RANGE_SELECTIVITY = 0.33
+# Equality columns matching more rows than this are left out of candidate
+# keys; the planner would rather scan than use them
+MAX_KEY_SELECTIVITY = 0.1
+MAX_INDEX_COLUMNS = 3
+
+def load_workload(path):
+    """Load SQL statements from a results CSV, a JSON dataset or a .sql file"""
+    sql_fields = ['generated_sql', 'corrected_sql', 'sql', 'query', 'Query', 'CorrectQuery']
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == '.sql':
+        with open(path, 'r', encoding='utf-8') as f:
+            return split_statements(f.read())
+
+    if extension == '.csv':
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            rows = json.load(f)
+
+    statements = []
+    for row in rows:
+        if isinstance(row, str):
+            statements.append(row)
+            continue
+        for field in sql_fields:
+            if row.get(field):
+                statements.append(row[field])
+                break
+    return statements
+
+def load_schema_file(path):
+    """
+    Read table columns and primary key / unique indexes from a CREATE TABLE script.
+
+    The number of distinct values is known for booleans, enums, columns
+    with a CHECK (column IN (...)) list and single-column unique keys. It
+    is given in the pg_stats.n_distinct convention: a positive count, or -1
+    for a column whose every value is distinct.
+
+    Returns:
+        tuple: ({table: {column: type}}, {table: [tuple(indexed columns)]},
+                {(table, column): n_distinct})
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        script = re.sub(r'--[^\n]*', '', f.read()).lower()
+
+    enums = {name: len(re.findall(r"'(?:[^']|'')*'", labels)) for name, labels in
+             re.findall(rf'create\s+type\s+({IDENTIFIER})\s+as\s+enum\s*\((.*?)\)\s*;', script, re.DOTALL)}
+    columns, indexes, n_distinct = {}, defaultdict(list), {}
+    for match in re.finditer(rf'create\s+table\s+(?:if\s+not\s+exists\s+)?({IDENTIFIER})\s*\((.*?)\)\s*;', script, re.DOTALL):
+        table, body = match.groups()
+        columns[table] = {}
+        # Split on commas that are not inside parentheses, e.g. NUMERIC(10,2)
+        for definition in re.split(r',(?![^()]*\))', body):
+            definition = definition.strip()
+            constraint = re.match(r'(?:constraint\s+\w+\s+)?(primary\s+key|unique)\s*\(([^)]*)\)', definition)
+            if constraint:
+                indexes[table].append(tuple(column.strip() for column in constraint.group(2).split(',')))
+                continue
+            column = re.match(rf'({IDENTIFIER})\s+({IDENTIFIER})', definition)
+            if column and column.group(1) not in ('foreign', 'check', 'constraint'):
+                name, column_type = column.groups()
+                columns[table][name] = column_type
+                allowed = re.search(rf'\bcheck\s*\(\s*{name}\s+in\s*\((.*?)\)', definition)
+                if re.search(r'\bprimary\s+key\b|\bunique\b', definition):
+                    indexes[table].append((name,))
+                    n_distinct[(table, name)] = -1
+                elif column_type in ('boolean', 'bool'):
+                    n_distinct[(table, name)] = 2
+                elif column_type in enums:
+                    n_distinct[(table, name)] = enums[column_type]
+                elif allowed:
+                    n_distinct[(table, name)] = len(allowed.group(1).split(','))
+    for table, keys in indexes.items():
+        for key in keys:
+            if len(key) == 1 and key[0] in columns.get(table, {}):
+                n_distinct[(table, key[0])] = -1
+    return columns, dict(indexes), n_distinct
+
+def load_schema_from_database(db=None):
+    """
+    Read columns, existing indexes, estimated row counts and distinct-value
+    statistics from the database
+    """
+    db = get_database(db)
+    conn = db.get_connection()
+    if not conn:
+        raise RuntimeError("Failed to connect to database")
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT table_name, column_name, data_type FROM information_schema.columns
+            WHERE table_schema = 'public'
+        """)
+        columns, n_distinct = defaultdict(dict), {}
+        for table, column, data_type in cursor.fetchall():
+            columns[table][column] = data_type
+            if data_type == 'boolean':
+                n_distinct[(table, column)] = 2
+
+        cursor.execute("SELECT tablename, attname, n_distinct FROM pg_stats WHERE schemaname = 'public'")
+        for table, column, distinct in cursor.fetchall():
+            if distinct:
+                n_distinct[(table, column)] = float(distinct)
+
+        cursor.execute("SELECT tablename, indexdef FROM pg_indexes WHERE schemaname = 'public'")
+        indexes = defaultdict(list)
+        for table, indexdef in cursor.fetchall():
+            match = re.search(r'\(([^)]*)\)', indexdef)
+            if match:
+                indexes[table].append(tuple(column.strip().strip('"') for column in match.group(1).split(',')))
+
+        cursor.execute("""
+            SELECT c.relname, c.reltuples FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public' AND c.relkind = 'r'
+        """)
+        table_rows = {table: max(float(rows), 0.0) for table, rows in cursor.fetchall()}
+
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'hypopg'")
+        has_hypopg = cursor.fetchone() is not None
+        return dict(columns), dict(indexes), table_rows, n_distinct, has_hypopg
+    finally:
+        cursor.close()
+        db.release_connection(conn)
+
+def _split_list(text):
+    items = []
+    for item in text.split(','):
+        item = re.sub(r'\b(asc|desc|nulls\s+first|nulls\s+last)\b', '', item).strip()
+        if re.fullmatch(COLUMN_REF, item):
+            items.append(item)
+    return items
+
+def extract_query_columns(sql_query, schema_columns=None):
+    """
+    Extract per-table column usage from one query.
+
+    Returns:
+        dict: {table: {"eq": [...], "range": [...], "join": [...],
+                       "group": [...], "order": [...]}}
+    """
+    text = STRING_LITERAL_PATTERN.sub('?', normalize_sql(sql_query))
+    known_tables = set(schema_columns) if schema_columns else None
+
+    aliases = {}
+    def register(name, alias):
+        table = name.split('.')[-1]
+        if known_tables is not None and table not in known_tables:
+            return
+        aliases[table] = table
+        if alias and alias not in SQL_KEYWORDS:
+            aliases[alias] = table
+
+    for _, name, alias in RELATION_PATTERN.findall(text):
+        register(name, alias)
+    for from_list in FROM_LIST_PATTERN.findall(text):
+        for item in from_list.split(',')[1:]:
+            parts = re.findall(IDENTIFIER, item.replace(' as ', ' '))
+            if parts and not item.strip().startswith('('):
+                register(parts[0], parts[1] if len(parts) > 1 else None)
+
+    tables = sorted(set(aliases.values()))
+
+    def resolve(reference):
+        if '.' in reference:
+            qualifier, column = reference.split('.', 1)
+            table = aliases.get(qualifier)
+            if table and (not schema_columns or column in schema_columns.get(table, ())):
+                return table, column
+            return None
+        if reference in SQL_KEYWORDS:
+            return None
+        if schema_columns:
+            owners = [table for table in tables if reference in schema_columns.get(table, ())]
+        else:
+            owners = tables
+        return (owners[0], reference) if len(owners) == 1 else None
+
+    usage = defaultdict(lambda: {"eq": [], "range": [], "join": [], "group": [], "order": []})
+    def add(kind, resolved):
+        if resolved and resolved[1] not in usage[resolved[0]][kind]:
+            usage[resolved[0]][kind].append(resolved[1])
+
+    def add_predicates(clause):
+        for left, operator, right in COMPARISON_PATTERN.findall(clause):
+            left_column, right_column = resolve(left), resolve(right)
+            if left_column and right_column:
+                if operator == '=':
+                    add("join", left_column)
+                    add("join", right_column)
+                continue
+            column = left_column or right_column
+            if operator in EQUALITY_OPERATORS:
+                add("eq", column)
+            elif operator in RANGE_OPERATORS:
+                add("range", column)
+        for reference, negated, operator in KEYWORD_PREDICATE_PATTERN.findall(clause):
+            if negated:
+                continue
+            add("eq" if operator in EQUALITY_OPERATORS else "range", resolve(reference))
+
+    for clause in WHERE_PATTERN.findall(text) + ON_PATTERN.findall(text):
+        add_predicates(clause)
+    for clause in GROUP_BY_PATTERN.findall(text):
+        for reference in _split_list(clause):
+            add("group", resolve(reference))
+    for clause in ORDER_BY_PATTERN.findall(text):
+        for reference in _split_list(clause):
+            add("order", resolve(reference))
+
+    return dict(usage)
+
+def candidate_indexes(usage, model=None):
+    """
+    Propose single- and multi-column indexes for one query's column usage.
+
+    With a cost model, equality columns are ordered most selective first and
+    unselective ones such as boolean flags are dropped.
+    """
+    candidates = set()
+    for table, columns in usage.items():
+        eq = columns["eq"]
+        if model:
+            eq = sorted((column for column in eq
+                         if model.equality_selectivity(table, column) <= MAX_KEY_SELECTIVITY),
+                        key=lambda column: model.equality_selectivity(table, column))
+        joins = [column for column in columns["join"] if column not in columns["eq"]]
+        for column in eq + joins + columns["range"]:
+            candidates.add((table, (column,)))
+
+        # Equality filters first, then one join, range or sort column. Only a
+        # single join column can drive a lookup, so joins never stack.
+        prefix = tuple(eq[:MAX_INDEX_COLUMNS])
+        if len(prefix) > 1:
+            candidates.add((table, prefix))
+        if prefix and len(prefix) < MAX_INDEX_COLUMNS:
+            for tail in (joins + columns["range"] + columns["order"])[:2]:
+                if tail not in prefix:
+                    candidates.add((table, prefix + (tail,)))
+        if len(columns["group"]) > 1:
+            candidates.add((table, tuple(columns["group"][:MAX_INDEX_COLUMNS])))
+    return candidates
+
+def index_name(table, columns):
+    name = f"idx_{table}_{'_'.join(columns)}"
+    if len(name) <= 63:
+        return name
+    # PostgreSQL truncates identifiers at 63 bytes, so keep truncated names unique
+    digest = hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]
+    return f"{name[:54]}_{digest}"
+
+def index_ddl(table, columns):
+    return f"CREATE INDEX IF NOT EXISTS {index_name(table, columns)} ON {table} ({', '.join(columns)})"
+
+class LocalCostModel:
+    """Rough planner-style costs for scanning one table with or without an index"""
+
+    def __init__(self, table_rows=None, default_rows=100000, n_distinct=None):
+        self.table_rows = table_rows or {}
+        self.default_rows = default_rows
+        self.n_distinct = n_distinct or {}
+
+    def rows(self, table):
+        return self.table_rows.get(table) or self.default_rows
+
+    def equality_selectivity(self, table, column):
+        """Fraction of rows matching column = value, as the planner would estimate it"""
+        distinct = self.n_distinct.get((table, column))
+        if not distinct:
+            return EQUALITY_SELECTIVITY
+        rows = self.rows(table)
+        # Negative values are a fraction of the row count, as in pg_stats
+        distinct = distinct if distinct > 0 else -distinct * rows
+        return min(max(1.0 / distinct, 1.0 / rows), 1.0)
+
+    def pages(self, table):
+        return max(math.ceil(self.rows(table) / ROWS_PER_PAGE), 1)
+
+    def seq_scan_cost(self, table):
+        rows = self.rows(table)
+        return self.pages(table) * SEQ_PAGE_COST + rows * (CPU_TUPLE_COST + CPU_OPERATOR_COST)
+
+    def index_scan_cost(self, table, index_columns, columns):
+        """Cost of an index scan, or None if the index cannot serve the query"""
+        selectivity, matched, used_join = 1.0, 0, False
+        for column in index_columns:
+            if column in columns["eq"]:
+                selectivity *= self.equality_selectivity(table, column)
+                matched += 1
+            elif column in columns["join"] and not used_join:
+                selectivity *= self.equality_selectivity(table, column)
+                matched += 1
+                used_join = True
+            elif column in columns["range"]:
+                selectivity *= RANGE_SELECTIVITY
+                matched += 1
+                break
+            else:
+                break
+        if not matched:
+            return None
+
+        # Costed like a bitmap scan: matching rows share heap pages, each page
+        # is read once, and reads get closer to sequential as more of the
+        # table is fetched
+        rows, pages = self.rows(table), self.pages(table)
+        matched_rows = max(rows * selectivity, 1.0)
+        depth = max(math.log(max(rows, 2), INDEX_ROWS_PER_PAGE), 1.0)
+        index_cost = ((depth + matched_rows / INDEX_ROWS_PER_PAGE) * RANDOM_PAGE_COST
+                      + matched_rows * (CPU_INDEX_TUPLE_COST + CPU_OPERATOR_COST))
+        # Mackert-Lohman estimate of distinct heap pages fetched
+        heap_pages = min(2.0 * pages * matched_rows / (2.0 * pages + matched_rows), pages)
+        page_cost = RANDOM_PAGE_COST - (RANDOM_PAGE_COST - SEQ_PAGE_COST) * math.sqrt(heap_pages / pages)
+        heap_cost = heap_pages * page_cost + matched_rows * (CPU_TUPLE_COST + CPU_OPERATOR_COST)
+        return index_cost + heap_cost
+
+    def query_cost(self, usage, indexes):
+        """Sum over the query's tables of the cheapest access path"""
+        total = 0.0
+        for table, columns in usage.items():
+            cost = self.seq_scan_cost(table)
+            for index_columns in indexes.get(table, ()):
+                index_cost = self.index_scan_cost(table, index_columns, columns)
+                if index_cost is not None:
+                    cost = min(cost, index_cost)
+            total += cost
+        return total
+
+class HypoPGEvaluator:
+    """
+    Plans queries with EXPLAIN against hypothetical indexes from the hypopg extension.
+
+    Hypothetical indexes live in the session, not a transaction, so the
+    connection runs in autocommit mode and never holds table locks between
+    statements.
+    """
+
+    def __init__(self, db=None):
+        self.db = get_database(db)
+        self.conn = self.db.get_connection()
+        if not self.conn:
+            raise RuntimeError("Failed to connect to database")
+        self.conn.autocommit = True
+        self.cursor = self.conn.cursor()
+
+    def query_cost(self, sql_query):
+        # psycopg2 would run every statement after the first instead of planning it
+        statements = split_statements(sql_query)
+        if len(statements) != 1:
+            return None
+        try:
+            self.cursor.execute(f"EXPLAIN (FORMAT JSON) {statements[0]}")
+            plan = self.cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return plan[0]["Plan"]["Total Cost"]
+        except Exception:
+            return None
+
+    def create(self, table, columns):
+        self.cursor.execute("SELECT * FROM hypopg_create_index(%s)", (index_ddl(table, columns),))
+
+    def reset(self):
+        self.cursor.execute("SELECT hypopg_reset()")
+
+    def close(self):
+        self.reset()
+        self.cursor.close()
+        self.conn.autocommit = False
+        self.db.release_connection(self.conn)
+
+def _is_prefix(short, long):
+    return len(short) <= len(long) and tuple(long[:len(short)]) == tuple(short)
+
+def advise(statements, schema_columns=None, existing_indexes=None, table_rows=None,
+           evaluator=None, max_indexes=10, default_rows=100000, n_distinct=None):
+    """
+    Rank candidate indexes for a workload and pick the most beneficial ones.
+
+    Selection is greedy: every round re-measures each remaining candidate on
+    top of the indexes picked so far and keeps the one with the largest
+    benefit, until no candidate helps or max_indexes are picked.
+
+    Returns:
+        tuple: (recommendations, report). Each recommendation has the table,
+               columns, DDL and estimated benefit; each report row has the
+               query's cost before and after the recommended indexes.
+    """
+    existing_indexes = {table: list(indexes) for table, indexes in (existing_indexes or {}).items()}
+    model = LocalCostModel(table_rows, default_rows, n_distinct)
+
+    queries = []
+    candidates = defaultdict(set)
+    for position, sql_query in enumerate(statements):
+        usage = extract_query_columns(sql_query, schema_columns)
+        if not usage:
+            continue
+        queries.append((position, sql_query, usage))
+        for candidate in candidate_indexes(usage, model):
+            candidates[candidate].add(len(queries) - 1)
+
+    # Indexes that already exist, or are covered by an existing one, are skipped
+    candidates = {
+        (table, columns): query_ids for (table, columns), query_ids in candidates.items()
+        if not any(_is_prefix(columns, existing) for existing in existing_indexes.get(table, ()))
+    }
+
+    def costs(query_ids, added):
+        """Cost of each query with the added indexes on top of the existing ones"""
+        if evaluator:
+            evaluator.reset()
+            for table, columns in added:
+                evaluator.create(table, columns)
+            return [evaluator.query_cost(queries[query_id][1]) for query_id in query_ids]
+        trial = {table: list(indexes) for table, indexes in existing_indexes.items()}
+        for table, columns in added:
+            trial.setdefault(table, []).append(columns)
+        return [model.query_cost(queries[query_id][2], trial) for query_id in query_ids]
+
+    all_ids = list(range(len(queries)))
+    baseline = costs(all_ids, [])
+    current = list(baseline)
+
+    chosen = []
+    remaining = set(candidates)
+    while remaining and len(chosen) < max_indexes:
+        picked = [(table, columns) for table, columns, _ in chosen]
+        best, best_benefit, best_costs = None, 0.0, None
+        for candidate in sorted(remaining):
+            query_ids = sorted(candidates[candidate])
+            trial_costs = costs(query_ids, picked + [candidate])
+            benefit = sum(max(current[query_id] - cost, 0.0) for query_id, cost in zip(query_ids, trial_costs)
+                          if cost is not None and current[query_id] is not None)
+            if benefit > best_benefit:
+                best, best_benefit, best_costs = candidate, benefit, trial_costs
+        if best is None:
+            break
+
+        remaining.discard(best)
+        for query_id, cost in zip(sorted(candidates[best]), best_costs):
+            if cost is not None and current[query_id] is not None:
+                current[query_id] = min(current[query_id], cost)
+        table, columns = best
+        # A wider index with the same leading columns replaces a narrower one
+        replaced = [entry for entry in chosen if entry[0] == table and _is_prefix(entry[1], columns)]
+        chosen = [entry for entry in chosen if entry not in replaced]
+        chosen.append((table, columns, best_benefit + sum(entry[2] for entry in replaced)))
+        remaining = {candidate for candidate in remaining
+                     if not (candidate[0] == table and _is_prefix(candidate[1], columns))}
+
+    after = costs(all_ids, [(table, columns) for table, columns, _ in chosen])
+    if evaluator:
+        evaluator.reset()
+
+    recommendations = [{
+        "table": table,
+        "columns": list(columns),
+        "ddl": index_ddl(table, columns),
+        "estimated_benefit": round(benefit, 2),
+        "queries_served": len(candidates[(table, columns)])
+    } for table, columns, benefit in chosen]
+
+    report = []
+    for (position, sql_query, _), before_cost, after_cost in zip(queries, baseline, after):
+        speedup = None
+        if before_cost is not None and after_cost:
+            speedup = round(before_cost / after_cost, 2)
+        used = [index_name(table, columns) for table, columns, _ in chosen
+                if position in {queries[query_id][0] for query_id in candidates[(table, columns)]}]
+        report.append({
+            "query_index": position,
+            "sql": " ".join(sql_query.split())[:200],
+            "cost_before": None if before_cost is None else round(before_cost, 2),
+            "cost_after": None if after_cost is None else round(after_cost, 2),
+            "speedup": speedup,
+            "recommended_indexes": ";".join(used)
+        })
+    return recommendations, report
+
+def write_ddl_script(recommendations, output_file, source):
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(f"-- Index recommendations for workload {source}\n")
+        f.write("-- Ranked by estimated benefit (planner cost units summed over the workload)\n\n")
+        for recommendation in recommendations:
+            f.write(f"-- benefit {recommendation['estimated_benefit']}, serves {recommendation['queries_served']} queries\n")
+            f.write(recommendation["ddl"] + ";\n\n")
+    print(f"DDL script saved to {output_file}")
+
+def write_report(report, output_file):
+    fields = ["query_index", "sql", "cost_before", "cost_after", "speedup", "recommended_indexes"]
+    with open(output_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(report)
+    print(f"Speedup report saved to {output_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Recommend indexes for a workload of SQL queries')
+    parser.add_argument('--workload', type=str, default='nl_to_sql_results.csv', help='Workload file: results CSV, JSON dataset or .sql script')
+    parser.add_argument('--schema-file', type=str, default='hackathon_database_iitd.sql', help='CREATE TABLE script to read the schema from when not using --database')
+    parser.add_argument('--database', type=str, default=None, help='DSN of a database to read schema, statistics and indexes from; uses hypopg when installed')
+    parser.add_argument('--use-default-database', action='store_true', help='Read the schema from the database in database.DB_CONFIG')
+    parser.add_argument('--max-indexes', type=int, default=10, help='Maximum number of indexes to recommend')
+    parser.add_argument('--default-rows', type=int, default=100000, help='Table size assumed by the local cost model when statistics are unavailable')
+    parser.add_argument('--ddl-output', type=str, default='index_recommendations.sql', help='Path to the DDL script to write')
+    parser.add_argument('--report-output', type=str, default='index_report.csv', help='Path to the per-query speedup report to write')
+    args = parser.parse_args()
+
+    statements = load_workload(args.workload)
+    print(f"Loaded {len(statements)} statements from {args.workload}")
+
+    table_rows, evaluator = None, None
+    if args.database or args.use_default_database:
+        schema_columns, existing_indexes, table_rows, n_distinct, has_hypopg = load_schema_from_database(args.database)
+        if has_hypopg:
+            evaluator = HypoPGEvaluator(args.database)
+            print("Estimating benefit with hypothetical indexes (hypopg)")
+        else:
+            print("hypopg is not installed; estimating benefit with the local cost model")
+    else:
+        schema_columns, existing_indexes, n_distinct = load_schema_file(args.schema_file)
+        print("Estimating benefit with the local cost model")
+
+    try:
+        recommendations, report = advise(
+            statements, schema_columns, existing_indexes, table_rows, evaluator,
+            args.max_indexes, args.default_rows, n_distinct
+        )
+    finally:
+        if evaluator:
+            evaluator.close()
+
+    for recommendation in recommendations:
+        print(f"  {recommendation['ddl']}  (benefit {recommendation['estimated_benefit']})")
+    write_ddl_script(recommendations, args.ddl_output, args.workload)
+    write_report(report, args.report_output)
+
+if __name__ == "__main__":
+    main()
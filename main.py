@@ -1,31 +1,21 @@
 import os
+import sys
 import json
-import pandas as pd
 import argparse
 import time
-import concurrent.futures
-from tqdm import tqdm
+import shutil
+import tempfile
+import subprocess
 from database import test_connection
 from groq_client import GroqClient
 from nl_to_sql import NLtoSQLConverter
 from sql_corrector import SQLCorrector
-
-class QueryCache:
-    def __init__(self):
-        self.nl_to_sql_cache = {}
-        self.sql_correction_cache = {}
-    
-    def get_nl_to_sql(self, nl_query):
-        return self.nl_to_sql_cache.get(nl_query)
-    
-    def set_nl_to_sql(self, nl_query, result):
-        self.nl_to_sql_cache[nl_query] = result
-    
-    def get_sql_correction(self, incorrect_sql):
-        return self.sql_correction_cache.get(incorrect_sql)
-    
-    def set_sql_correction(self, incorrect_sql, result):
-        self.sql_correction_cache[incorrect_sql] = result
+from result_cache import ResultCache
+from query_cache import QueryCache, SQLiteQueryCache, scoped_key
+from result_store import ResultStore
+from cost_guard import CostGuard
+from sandbox import Sandbox, TemplateClones
+from worker_pool import process_in_order
 
 cache = QueryCache()
 
@@ -38,80 +28,350 @@ def load_json_data(file_path):
         return []
 
 def save_results_to_csv(results, output_file):
+    import pandas as pd
+
     try:
+        if results and "index" in results[0]:
+            results = sorted(results, key=lambda result: result["index"])
         df = pd.DataFrame(results)
         df.to_csv(output_file, index=False)
         print(f"Results saved to {output_file}")
     except Exception as e:
         print(f"Error saving results to {output_file}: {e}")
 
+def parse_shard(value):
+    """Parse a shard spec such as 2/8 into (2, 8)"""
+    try:
+        shard_index, shard_count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like i/N, got {value!r}")
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise argparse.ArgumentTypeError(f"Shard index must be in [0, {shard_count}), got {value!r}")
+    return shard_index, shard_count
+
+def shard_output_path(output_file, shard_index, shard_count):
+    base, extension = os.path.splitext(output_file)
+    return f"{base}.shard-{shard_index}-of-{shard_count}{extension}"
+
+def select_shard(data, shard=None):
+    """
+    Pair every item with its position in the dataset, keeping only this shard's items.
+
+    Items are dealt round-robin, so every shard gets a deterministic, evenly
+    sized slice no matter how the dataset is ordered.
+    """
+    indexed = list(enumerate(data))
+    if shard is None:
+        return indexed
+    shard_index, shard_count = shard
+    return [(index, item) for index, item in indexed if index % shard_count == shard_index]
+
+def merge_shard_outputs(output_file, shard_count):
+    """Merge per-shard result segments into one file ordered by dataset index"""
+    import pandas as pd
+
+    segments = [shard_output_path(output_file, i, shard_count) for i in range(shard_count)]
+    missing = [segment for segment in segments if not os.path.exists(segment)]
+    if missing:
+        print(f"Cannot merge {output_file}, missing segments: {', '.join(missing)}")
+        return False
+    frames = []
+    for segment in segments:
+        # A shard with no items, or whose items all failed, has an empty segment
+        try:
+            frames.append(pd.read_csv(segment))
+        except pd.errors.EmptyDataError:
+            print(f"Segment {segment} is empty; skipping it")
+    merged = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if "index" in merged.columns:
+        merged = merged.sort_values("index", kind="stable")
+    merged.to_csv(output_file, index=False)
+    print(f"Merged {shard_count} segments into {output_file} ({len(merged)} results)")
+    return True
+
+def create_result_store(output_file, prefix):
+    """Execution results are stored next to the output file, one file per item"""
+    directory = os.path.splitext(output_file)[0] + "_executions"
+    return ResultStore(directory, prefix)
+
 def process_nl_query(args):
-    converter, nl_query, execute = args
-    cached_result = cache.get_nl_to_sql(nl_query)
+    converter, nl_query, execute, store = args
+    key = scoped_key(converter, nl_query, execute)
+    cached_result = cache.get_nl_to_sql(key)
     if cached_result:
         return cached_result
     result = converter.nl_to_sql(nl_query, execute)
-    cache.set_nl_to_sql(nl_query, result)
+    if store:
+        result = store.spill(result)
+    cache.set_nl_to_sql(key, result)
     return result
 
 def process_incorrect_sql(args):
-    corrector, incorrect_sql, execute = args
-    cached_result = cache.get_sql_correction(incorrect_sql)
+    corrector, incorrect_sql, execute, store = args
+    key = scoped_key(corrector, incorrect_sql, execute)
+    cached_result = cache.get_sql_correction(key)
     if cached_result:
         return cached_result
     result = corrector.correct_sql(incorrect_sql, execute)
-    cache.set_sql_correction(incorrect_sql, result)
+    if store:
+        result = store.spill(result)
+    cache.set_sql_correction(key, result)
     return result
 
-def process_nl_to_sql_task(data_file, output_file, execute=False, max_workers=4, batch_size=10):
+def process_nl_to_sql_task(data_file, output_file, execute=False, max_workers=4, batch_size=10, result_cache=None, db=None, cost_guard=None, shard=None, sandbox=None):
     print(f"Processing NL to SQL task using {data_file}")
     data = load_json_data(data_file)
     if not data:
         print("No data found. Exiting.")
         return
-    converter = NLtoSQLConverter()
+    converter = NLtoSQLConverter(result_cache=result_cache, db=db, cost_guard=cost_guard, sandbox=sandbox)
+    if shard:
+        prefix = f"nl-shard{shard[0]}"
+        output_file, store_output = shard_output_path(output_file, *shard), output_file
+    else:
+        prefix, store_output = "nl", output_file
+    store = create_result_store(store_output, prefix) if execute else None
+    data = select_shard(data, shard)
+    worker = lambda pair: process_nl_query((converter, pair[1].get("nl_query", ""), execute, store))
     all_results = []
-    for i in range(0, len(data), batch_size):
-        batch = data[i:i+batch_size]
-        task_args = [(converter, item.get("nl_query", ""), execute) for item in batch]
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(process_nl_query, args): args for args in task_args}
-            for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc=f"Batch {i//batch_size + 1}/{(len(data)-1)//batch_size + 1}"):
-                try:
-                    result = future.result()
-                    all_results.append(result)
-                except Exception as exc:
-                    print(f"Query processing generated an exception: {exc}")
-        if i % (batch_size * 5) == 0 and i > 0:
+    for count, ((index, _), result) in enumerate(process_in_order(data, worker, max_workers), 1):
+        if isinstance(result, Exception):
+            print(f"Query processing generated an exception: {result}")
+        else:
+            # Cached results are shared, so copy before tagging with the index
+            all_results.append({"index": index, **result})
+        if count % (batch_size * 5) == 0:
             save_results_to_csv(all_results, output_file)
-        time.sleep(2)
     save_results_to_csv(all_results, output_file)
 
-def process_sql_correction_task(data_file, output_file, execute=False, max_workers=4, batch_size=10):
+def process_sql_correction_task(data_file, output_file, execute=False, max_workers=4, batch_size=10, result_cache=None, db=None, shard=None, sandbox=None):
     print(f"Processing SQL correction task using {data_file}")
     data = load_json_data(data_file)
     if not data:
         print("No data found. Exiting.")
         return
-    corrector = SQLCorrector()
+    corrector = SQLCorrector(result_cache=result_cache, db=db, sandbox=sandbox)
+    if shard:
+        prefix = f"sql-shard{shard[0]}"
+        output_file, store_output = shard_output_path(output_file, *shard), output_file
+    else:
+        prefix, store_output = "sql", output_file
+    store = create_result_store(store_output, prefix) if execute else None
+    data = select_shard(data, shard)
+    worker = lambda pair: process_incorrect_sql((corrector, pair[1].get("incorrect_sql", ""), execute, store))
     all_results = []
-    for i in range(0, len(data), batch_size):
-        batch = data[i:i+batch_size]
-        task_args = [(corrector, item.get("incorrect_sql", ""), execute) for item in batch]
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(process_incorrect_sql, args): args for args in task_args}
-            for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc=f"Batch {i//batch_size + 1}/{(len(data)-1)//batch_size + 1}"):
-                try:
-                    result = future.result()
-                    all_results.append(result)
-                except Exception as exc:
-                    print(f"Query correction generated an exception: {exc}")
-        if i % (batch_size * 5) == 0 and i > 0:
+    for count, ((index, _), result) in enumerate(process_in_order(data, worker, max_workers), 1):
+        if isinstance(result, Exception):
+            print(f"Query correction generated an exception: {result}")
+        else:
+            # Cached results are shared, so copy before tagging with the index
+            all_results.append({"index": index, **result})
+        if count % (batch_size * 5) == 0:
             save_results_to_csv(all_results, output_file)
-        time.sleep(2)
     save_results_to_csv(all_results, output_file)
 
+def create_execution_context(args):
+    """
+    Build the result cache, cost guard, sandbox and template clones a run asks for.
+
+    Returns:
+        tuple: (result_cache, cost_guard, sandbox, clones), any of them None
+               when not requested, or None if the clones could not be created
+    """
+    result_cache = None
+    if args.execute and not args.no_result_cache:
+        result_cache = ResultCache(
+            max_memory_bytes=args.result_cache_mb * 1024 * 1024,
+            spill_dir=args.result_cache_dir,
+            snapshot_id=args.snapshot_id,
+            max_spill_bytes=args.result_cache_disk_mb * 1024 * 1024
+        )
+    cost_guard = None
+    if args.cost_guard:
+        cost_guard = CostGuard(args.max_cost, args.large_table_rows, rewrite=args.cost_rewrite)
+    clones = None
+    if args.sandbox_template:
+        clones = TemplateClones(args.sandbox_template, args.max_workers, args.database)
+        if not clones.create():
+            clones.close()
+            return None
+    sandbox = Sandbox(args.statement_timeout, clones=clones) if args.sandbox or clones else None
+    return result_cache, cost_guard, sandbox, clones
+
+def finish_ingested_results(results, processor, sql_field, store=None, max_workers=4):
+    """
+    Run ingested batch results through the rest of the live pipeline.
+
+    Each result's SQL gets the processor's cost guard review, if it has one,
+    and is executed and spilled to the store when one is given. Items whose
+    batch request failed are passed through unchanged.
+    """
+    def finish(result):
+        if result.get(sql_field) is None:
+            return result
+        result = dict(result)
+        if getattr(processor, "cost_guard", None):
+            processor.apply_cost_guard(result)
+        if store:
+            processor.attach_execution(result, result[sql_field])
+            result = store.spill(result)
+        return result
+
+    finished = []
+    for result, outcome in process_in_order(results, finish, max_workers):
+        if isinstance(outcome, Exception):
+            outcome = {**result, "error": str(outcome)}
+        finished.append(outcome)
+    return finished
+
+def run_batch_job(args):
+    """
+    Render, submit, poll or ingest provider batch files for the selected tasks.
+
+    Ingested SQL goes through the same cost guard, execution and result
+    store as a live run when --cost-guard or --execute is given.
+    """
+    from batch_jobs import GroqBatchTransport, LocalBatchTransport
+
+    step = args.batch_job
+    # Ingesting with --execute or --cost-guard runs the SQL against the database
+    finishing = step in ['ingest', 'run'] and (args.execute or args.cost_guard)
+    if (step in ['render', 'run'] or finishing) and not test_connection(args.database):
+        print("Database connection failed. Please check your configuration.")
+        return
+    try:
+        client = GroqClient()
+    except Exception as e:
+        print(f"Groq client initialization failed: {e}")
+        return
+    os.makedirs(args.batch_dir, exist_ok=True)
+    if args.batch_transport == 'local':
+        transport = LocalBatchTransport(os.path.join(args.batch_dir, 'local'))
+    else:
+        transport = GroqBatchTransport(client)
+
+    context = create_execution_context(args) if finishing else (None, None, None, None)
+    if context is None:
+        return
+    result_cache, cost_guard, sandbox, clones = context
+    try:
+        _run_batch_tasks(args, step, client, transport, result_cache, cost_guard, sandbox)
+    finally:
+        if clones:
+            clones.close()
+
+def _run_batch_tasks(args, step, client, transport, result_cache, cost_guard, sandbox):
+    from batch_jobs import render_nl_to_sql_batch, render_sql_correction_batch, ingest_batch_output, wait_for_batch
+
+    tasks = []
+    if args.task in ['generate', 'both']:
+        converter = NLtoSQLConverter(client, result_cache, args.database, cost_guard, sandbox)
+        tasks.append(('generate', 'nl', args.nl_data, args.nl_output, converter, render_nl_to_sql_batch))
+    if args.task in ['correct', 'both']:
+        corrector = SQLCorrector(client, result_cache, args.database, sandbox)
+        tasks.append(('correct', 'sql', args.sql_data, args.sql_output, corrector, render_sql_correction_batch))
+
+    for task, prefix, data_file, output_file, processor, render in tasks:
+        batch_path = os.path.join(args.batch_dir, f"{task}.batch.jsonl")
+        batch_id_path = os.path.join(args.batch_dir, f"{task}.batch_id")
+        output_path = os.path.join(args.batch_dir, f"{task}.output.jsonl")
+
+        if step in ['render', 'run']:
+            data = load_json_data(data_file)
+            if not data:
+                print(f"No data found in {data_file}. Skipping {task}.")
+                continue
+            count = render(data, batch_path, processor)
+            print(f"Rendered {count} {task} requests to {batch_path}")
+
+        if step in ['submit', 'run']:
+            batch_id = transport.submit(batch_path)
+            with open(batch_id_path, 'w') as f:
+                f.write(batch_id)
+            print(f"Submitted {task} batch {batch_id}")
+
+        if step in ['poll', 'run']:
+            with open(batch_id_path) as f:
+                batch_id = f.read().strip()
+            if step == 'run':
+                status = wait_for_batch(transport, batch_id, args.batch_poll_interval)
+            else:
+                status = transport.status(batch_id)
+                print(f"Batch {batch_id}: {status}")
+            if status != 'completed':
+                continue
+            transport.download(batch_id, output_path)
+            print(f"Downloaded {task} batch output to {output_path}")
+
+        if step in ['ingest', 'run']:
+            if not os.path.exists(output_path):
+                print(f"No batch output at {output_path}. Poll the batch first.")
+                continue
+            results = ingest_batch_output(output_path, batch_path, task, processor.extract_sql_from_response)
+            failed = sum(1 for result in results if "error" in result)
+            print(f"Ingested {len(results)} {task} results ({failed} failed)")
+            if args.execute or args.cost_guard:
+                store = create_result_store(output_file, prefix) if args.execute else None
+                sql_field = "generated_sql" if task == 'generate' else "corrected_sql"
+                results = finish_ingested_results(results, processor, sql_field, store, args.max_workers)
+            save_results_to_csv(results, output_file)
+
+def output_files_for(args):
+    outputs = []
+    if args.task in ['generate', 'both']:
+        outputs.append(args.nl_output)
+    if args.task in ['correct', 'both']:
+        outputs.append(args.sql_output)
+    return outputs
+
+def run_sharded(args, argv):
+    """
+    Coordinate a sharded run: spawn one worker process per shard, each with
+    its own slice of the input and its own output segment, sharing a SQLite
+    query cache, then merge the segments in dataset order.
+
+    Without --cache-db the shared cache is a temporary file that is deleted
+    after the run, so a later run never replays this run's answers.
+
+    Returns:
+        bool: True if every shard succeeded and every output was merged
+    """
+    shard_count = args.processes
+    child_argv = []
+    skip_next = False
+    for arg in argv:
+        if skip_next:
+            skip_next = False
+        elif arg == '--processes':
+            skip_next = True
+        elif not arg.startswith('--processes='):
+            child_argv.append(arg)
+    cache_dir = None
+    if not args.cache_db:
+        cache_dir = tempfile.mkdtemp(prefix='ignis_query_cache_')
+        child_argv += ['--cache-db', os.path.join(cache_dir, 'query_cache.sqlite')]
+
+    script = os.path.abspath(__file__)
+    try:
+        workers = [
+            subprocess.Popen([sys.executable, script] + child_argv + ['--shard', f"{i}/{shard_count}"])
+            for i in range(shard_count)
+        ]
+        failed = [i for i, worker in enumerate(workers) if worker.wait() != 0]
+    finally:
+        if cache_dir:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+    if failed:
+        # A failed shard may have left a partial segment, which would merge silently
+        print(f"Shards {failed} failed; not merging. Rerun them with --shard i/{shard_count}, "
+              f"then merge with --merge-shards {shard_count}")
+        return False
+    merged = [merge_shard_outputs(output_file, shard_count) for output_file in output_files_for(args)]
+    return all(merged)
+
 def main():
+    global cache
+
     parser = argparse.ArgumentParser(description='AI-Powered SQL Query Generator and Error Corrector')
     parser.add_argument('--task', type=str, choices=['generate', 'correct', 'both'], default='both', help='Task to perform: generate (NL to SQL), correct (SQL correction), or both')
     parser.add_argument('--execute', action='store_true', help='Execute the generated/corrected SQL queries')
@@ -120,23 +380,73 @@ def main():
     parser.add_argument('--nl-output', type=str, default='nl_to_sql_results.csv', help='Path to output file for NL to SQL results')
     parser.add_argument('--sql-output', type=str, default='sql_correction_results.csv', help='Path to output file for SQL correction results')
     parser.add_argument('--max-workers', type=int, default=4, help='Maximum number of worker threads for parallel processing')
-    parser.add_argument('--batch-size', type=int, default=10, help='Number of queries to process in each batch')
+    parser.add_argument('--batch-size', type=int, default=10, help='Partial results are saved after every 5 * batch-size queries')
+    parser.add_argument('--no-result-cache', action='store_true', help='Disable caching of read-only query results when executing')
+    parser.add_argument('--result-cache-dir', type=str, default=None, help='Directory for spilling large or evicted cached results to disk')
+    parser.add_argument('--result-cache-mb', type=int, default=256, help='Maximum memory used by the result cache in megabytes')
+    parser.add_argument('--result-cache-disk-mb', type=int, default=1024, help='Maximum disk space used by spilled results in megabytes')
+    parser.add_argument('--snapshot-id', type=str, default=None, help='Database snapshot id to key cached results on instead of table modification counters')
+    parser.add_argument('--check-api-key', action='store_true', help='Verify the Groq API key against the API before processing')
+    parser.add_argument('--cost-guard', action='store_true', help='Plan generated SQL with EXPLAIN and record its estimated cost and problems')
+    parser.add_argument('--cost-rewrite', action='store_true', help='With --cost-guard, ask the LLM for a cheaper equivalent of flagged queries')
+    parser.add_argument('--max-cost', type=float, default=100000.0, help='Planner cost above which generated SQL is flagged')
+    parser.add_argument('--large-table-rows', type=int, default=100000, help='Sequential scans of tables with at least this many rows are flagged')
+    parser.add_argument('--database', type=str, default=None, help='DSN of the database to use instead of the one in database.DB_CONFIG')
+    parser.add_argument('--batch-job', type=str, choices=['render', 'submit', 'poll', 'ingest', 'run'], default=None, help='Use the provider batch API instead of live requests: render, submit, poll or ingest batch files, or run all steps')
+    parser.add_argument('--batch-dir', type=str, default='batch_jobs', help='Directory for batch input, manifest and output files')
+    parser.add_argument('--batch-transport', type=str, choices=['groq', 'local'], default='groq', help='Where to submit batch files: the Groq batch API or a local file-based stand-in')
+    parser.add_argument('--batch-poll-interval', type=int, default=60, help='Seconds between status checks while waiting on a batch')
+    parser.add_argument('--shard', type=parse_shard, default=None, help='Process only shard i of N (e.g. 0/4) and write a per-shard output segment')
+    parser.add_argument('--processes', type=int, default=None, help='Run N shard worker processes and merge their output segments')
+    parser.add_argument('--merge-shards', type=int, default=None, help='Only merge the output segments of N shards, e.g. after running shards on several machines')
+    parser.add_argument('--cache-db', type=str, default=None, help='SQLite file for a query cache shared across processes and runs')
+    parser.add_argument('--sandbox', action='store_true', help='With --execute, run every statement in a transaction that is always rolled back')
+    parser.add_argument('--sandbox-template', type=str, default=None, help='Give each worker its own database cloned from this template database to sandbox in (implies --sandbox)')
+    parser.add_argument('--statement-timeout', type=int, default=30000, help='Milliseconds a sandboxed statement may run before it is cancelled')
     args = parser.parse_args()
     start_time = time.time()
-    if not test_connection():
+    if args.merge_shards:
+        merged = [merge_shard_outputs(output_file, args.merge_shards) for output_file in output_files_for(args)]
+        if not all(merged):
+            sys.exit(1)
+        return
+    if args.processes and args.processes > 1 and not args.shard:
+        succeeded = run_sharded(args, sys.argv[1:])
+        print(f"Total execution time: {time.time() - start_time:.2f} seconds")
+        if not succeeded:
+            sys.exit(1)
+        return
+    if args.cache_db:
+        cache = SQLiteQueryCache(args.cache_db)
+    if args.batch_job:
+        run_batch_job(args)
+        print(f"Total execution time: {time.time() - start_time:.2f} seconds")
+        return
+    if not test_connection(args.database):
         print("Database connection failed. Please check your configuration.")
         return
     try:
         client = GroqClient()
-        _ = client.get_completion("test", max_tokens=10)
+        if args.check_api_key:
+            client.check_api_key()
     except Exception as e:
         print(f"Groq API connection failed: {e}")
         print("Please set your GROQ_API_KEY environment variable or provide it in the code.")
         return
-    if args.task in ['generate', 'both']:
-        process_nl_to_sql_task(args.nl_data, args.nl_output, args.execute, args.max_workers, args.batch_size)
-    if args.task in ['correct', 'both']:
-        process_sql_correction_task(args.sql_data, args.sql_output, args.execute, args.max_workers, args.batch_size)
+    context = create_execution_context(args)
+    if context is None:
+        return
+    result_cache, cost_guard, sandbox, clones = context
+    try:
+        if args.task in ['generate', 'both']:
+            process_nl_to_sql_task(args.nl_data, args.nl_output, args.execute, args.max_workers, args.batch_size, result_cache, args.database, cost_guard, args.shard, sandbox)
+        if args.task in ['correct', 'both']:
+            process_sql_correction_task(args.sql_data, args.sql_output, args.execute, args.max_workers, args.batch_size, result_cache, args.database, args.shard, sandbox)
+    finally:
+        if clones:
+            clones.close()
+    if result_cache:
+        print(f"Result cache: {result_cache.stats()}")
     elapsed_time = time.time() - start_time
     print(f"Total execution time: {elapsed_time:.2f} seconds")
 
@@ -1,51 +1,28 @@
-import re
-from database import execute_query
-from schema_extractor import format_schema_for_prompt
-from groq_client import GroqClient
+from sql_processor import SQLProcessor
 
-class NLtoSQLConverter:
-    def __init__(self, groq_client=None):
-        """Initialize the NL to SQL converter"""
-        self.groq_client = groq_client or GroqClient()
-        self.schema_info = format_schema_for_prompt()
+class NLtoSQLConverter(SQLProcessor):
+    def __init__(self, groq_client=None, result_cache=None, db=None, cost_guard=None, sandbox=None):
+        """
+        Initialize the NL to SQL converter.
+
+        Args:
+            cost_guard: A cost_guard.CostGuard that reviews the plan of every
+                generated query and records its estimated cost.
+
+        The other arguments are described on SQLProcessor.
+        """
+        super().__init__(groq_client, result_cache, db, sandbox)
+        self.cost_guard = cost_guard
     
-    def extract_sql_from_response(self, response):
-        """Extract the SQL query from the LLM response"""
-        # Try to extract SQL code block
-        sql_match = re.search(r'```sql\s*(.*?)\s*```', response, re.DOTALL)
-        if sql_match:
-            return sql_match.group(1).strip()
-        
-        # Try to extract any code block
-        code_match = re.search(r'```\s*(.*?)\s*```', response, re.DOTALL)
-        if code_match:
-            return code_match.group(1).strip()
-        
-        # If no code blocks, try to extract lines that look like SQL
-        sql_keywords = ['SELECT', 'FROM', 'WHERE', 'GROUP BY', 'ORDER BY', 
-                        'HAVING', 'JOIN', 'INNER JOIN', 'LEFT JOIN', 'RIGHT JOIN',
-                        'INSERT', 'UPDATE', 'DELETE', 'CREATE', 'ALTER', 'DROP']
-        
-        lines = response.split('\n')
-        sql_lines = []
-        is_sql = False
-        
-        for line in lines:
-            line_upper = line.strip().upper()
-            
-            # Check if the line starts with an SQL keyword
-            if any(line_upper.startswith(keyword) for keyword in sql_keywords):
-                is_sql = True
-                sql_lines.append(line)
-            # Continue if we're in an SQL block
-            elif is_sql and line.strip():
-                sql_lines.append(line)
-        
-        if sql_lines:
-            return '\n'.join(sql_lines)
-        
-        # If all else fails, return the original response
-        return response
+    def apply_cost_guard(self, result):
+        """Review the plan of a result's generated SQL, swapping in a cheaper rewrite if one is accepted"""
+        review = self.cost_guard.guard(
+            result["generated_sql"], self.groq_client, self.schema_info, self.extract_sql_from_response, self.db
+        )
+        result["generated_sql"] = review.pop("sql")
+        review.pop("plan_summary", None)
+        result.update(review)
+        return result
     
     def nl_to_sql(self, nl_query, execute=False):
         """
@@ -70,15 +47,14 @@ class NLtoSQLConverter:
             "generated_sql": sql_query
         }
         
+        # Check the plan, possibly swapping in a cheaper rewrite
+        if self.cost_guard:
+            self.apply_cost_guard(result)
+            sql_query = result["generated_sql"]
+        
         # Execute the query if requested
         if execute:
-            try:
-                execution_result = execute_query(sql_query)
-                result["execution_success"] = True
-                result["execution_result"] = execution_result
-            except Exception as e:
-                result["execution_success"] = False
-                result["execution_error"] = str(e)
+            self.attach_execution(result, sql_query)
         
         return result
     
@@ -1,5 +1,4 @@
 import sys
-from groq_client import GroqClient
 from nl_to_sql import NLtoSQLConverter
 from sql_corrector import SQLCorrector
 
@@ -0,0 +1,129 @@
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+def scoped_key(processor, text, execute=False):
+    """
+    Cache key for a converter's or corrector's result on some text.
+
+    A result depends on the target database, on whether it was executed
+    (and sandboxed) and on the cost guard settings, so a cache that outlives
+    the run must never hand it to a run with a different configuration.
+    """
+    cost_guard = getattr(processor, "cost_guard", None)
+    guard = None if cost_guard is None else (
+        cost_guard.max_total_cost, cost_guard.large_table_rows, cost_guard.rewrite
+    )
+    return (processor.db.key, bool(execute), getattr(processor, "sandbox", None) is not None, guard, text)
+
+class QueryCache:
+    """
+    In-memory cache of LLM results.
+
+    With max_entries set, each kind of result keeps only that many entries
+    and the least recently used ones are evicted, which bounds the memory of
+    long-running processes such as the service.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self.nl_to_sql_cache = OrderedDict()
+        self.sql_correction_cache = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _get(self, store, key):
+        with self._lock:
+            result = store.get(key)
+            if result is not None:
+                store.move_to_end(key)
+            return result
+    
+    def _set(self, store, key, result):
+        with self._lock:
+            store[key] = result
+            store.move_to_end(key)
+            if self.max_entries is not None:
+                while len(store) > self.max_entries:
+                    store.popitem(last=False)
+    
+    def get_nl_to_sql(self, nl_query):
+        return self._get(self.nl_to_sql_cache, nl_query)
+    
+    def set_nl_to_sql(self, nl_query, result):
+        self._set(self.nl_to_sql_cache, nl_query, result)
+    
+    def get_sql_correction(self, incorrect_sql):
+        return self._get(self.sql_correction_cache, incorrect_sql)
+    
+    def set_sql_correction(self, incorrect_sql, result):
+        self._set(self.sql_correction_cache, incorrect_sql, result)
+
+    def discard(self, matches):
+        """Remove every entry whose key matches, e.g. after a schema change"""
+        with self._lock:
+            for store in (self.nl_to_sql_cache, self.sql_correction_cache):
+                for key in [key for key in store if matches(key)]:
+                    del store[key]
+
+class SQLiteQueryCache:
+    """
+    QueryCache backed by a SQLite file in WAL mode, so several processes on
+    one machine can reuse each other's results. WAL needs shared memory, so
+    the file must be on a local disk, not a network filesystem.
+
+    Results are stored as JSON. Anything JSON cannot represent natively is
+    stored as its string form, so spill execution results to a ResultStore
+    first if they need to survive the round-trip.
+    """
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS query_cache (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                result TEXT NOT NULL,
+                PRIMARY KEY (kind, key)
+            )
+        """)
+        conn.commit()
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, kind, key):
+        row = self._connection().execute(
+            "SELECT result FROM query_cache WHERE kind = ? AND key = ?", (kind, json.dumps(key))
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set(self, kind, key, result):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO query_cache (kind, key, result) VALUES (?, ?, ?)",
+            (kind, json.dumps(key), json.dumps(result, default=str))
+        )
+        conn.commit()
+
+    def get_nl_to_sql(self, nl_query):
+        return self._get("nl_to_sql", nl_query)
+    
+    def set_nl_to_sql(self, nl_query, result):
+        self._set("nl_to_sql", nl_query, result)
+    
+    def get_sql_correction(self, incorrect_sql):
+        return self._get("sql_correction", incorrect_sql)
+    
+    def set_sql_correction(self, incorrect_sql, result):
+        self._set("sql_correction", incorrect_sql, result)
@@ -0,0 +1,434 @@
+import os
+import re
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from database import get_database, execute_query
+
+# Quoted literals and identifiers are kept verbatim when normalizing SQL
+QUOTED_PATTERN = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+COMMENT_PATTERN = re.compile(r'--[^\n]*|/\*.*?\*/', re.DOTALL)
+IDENTIFIER_PATTERN = re.compile(r'"((?:[^"]|"")+)"|\b([a-z_][a-z0-9_$]*)\b')
+
+READ_ONLY_PREFIXES = ('select', 'with', 'values', 'table')
+
+# Anything that can write, lock or have side effects disqualifies a statement.
+# SELECT ... INTO creates a table, so INTO is rejected as well.
+WRITE_PATTERN = re.compile(
+    r'\b(insert|update|delete|merge|truncate|create|alter|drop|grant|revoke|'
+    r'copy|call|do|lock|vacuum|analyze|refresh|cluster|reindex|comment|'
+    r'into|nextval|setval|lo_import|lo_export|dblink\w*|pg_advisory\w*|'
+    r'pg_terminate_backend|pg_cancel_backend|set_config|pg_notify)\b'
+    r'|\bfor\s+(?:no\s+key\s+)?update\b|\bfor\s+(?:key\s+)?share\b'
+)
+
+# Calls to anything else, such as now(), random() or a user-defined function
+# that may write, make a result uncacheable
+CACHEABLE_FUNCTIONS = {
+    'count', 'sum', 'avg', 'min', 'max', 'string_agg', 'array_agg', 'bool_and', 'bool_or',
+    'stddev', 'variance', 'coalesce', 'nullif', 'greatest', 'least', 'lower', 'upper',
+    'length', 'char_length', 'substring', 'substr', 'trim', 'ltrim', 'rtrim', 'replace',
+    'concat', 'concat_ws', 'position', 'left', 'right', 'round', 'floor', 'ceil',
+    'ceiling', 'abs', 'mod', 'power', 'sqrt', 'cast', 'extract', 'date_part', 'date_trunc',
+    'to_char', 'row_number', 'rank', 'dense_rank', 'ntile', 'lag', 'lead',
+    'first_value', 'last_value', 'percentile_cont', 'percentile_disc'
+}
+# Keywords and type names that are followed by a parenthesis without being a call
+PARENTHESIZED_KEYWORDS = {
+    'select', 'from', 'where', 'and', 'or', 'not', 'in', 'exists', 'any', 'all', 'some',
+    'as', 'on', 'using', 'join', 'lateral', 'values', 'over', 'filter', 'within', 'by',
+    'when', 'then', 'else', 'case', 'between', 'is', 'like', 'ilike', 'union', 'except',
+    'intersect', 'having', 'limit', 'offset', 'distinct', 'with', 'numeric', 'decimal',
+    'varchar', 'char', 'character', 'varying', 'timestamp', 'time', 'interval'
+}
+FUNCTION_CALL_PATTERN = re.compile(r'\b([a-z_][a-z0-9_$]*)\s*\(')
+VOLATILE_PATTERN = re.compile(
+    r'\b(current_date|current_time|current_timestamp|localtime|localtimestamp|'
+    r'current_user|session_user|current_role|information_schema|pg_catalog|pg_\w+)\b'
+)
+
+# Per-table modification counters plus the relfilenode, which changes on
+# TRUNCATE and VACUUM FULL. Views are listed so a query over a view can fall
+# back to a database-wide token. The counters start again from zero after a
+# restart, crash recovery or pg_stat_reset(), so the server start time and the
+# last statistics reset are included as an epoch.
+STATE_QUERY = """
+SELECT 'table', relname,
+       n_tup_ins + n_tup_upd + n_tup_del || ':' || pg_relation_filenode(relid)
+FROM pg_stat_user_tables
+WHERE schemaname = 'public'
+UNION ALL
+SELECT 'view', viewname, NULL FROM pg_views WHERE schemaname = 'public'
+UNION ALL
+SELECT 'view', matviewname, NULL FROM pg_matviews WHERE schemaname = 'public'
+UNION ALL
+SELECT 'epoch', NULL, pg_postmaster_start_time() || '/' || coalesce(stats_reset::text, '')
+FROM pg_stat_database
+WHERE datname = current_database()
+"""
+
+def _split_quoted(query):
+    """Split a query into (text, is_quoted) segments"""
+    parts = QUOTED_PATTERN.split(query)
+    return [(part, i % 2 == 1) for i, part in enumerate(parts) if part]
+
+def normalize_sql(query):
+    """
+    Normalize SQL text for use as a cache key.
+
+    Comments are removed, whitespace is collapsed and unquoted text is
+    lower-cased. String literals and quoted identifiers are left untouched.
+    """
+    normalized = []
+    for text, is_quoted in _split_quoted(query):
+        if is_quoted:
+            normalized.append(text)
+        else:
+            text = COMMENT_PATTERN.sub(' ', text)
+            normalized.append(re.sub(r'\s+', ' ', text).lower())
+    return ''.join(normalized).strip().rstrip(';').strip()
+
+def is_read_only(query):
+    """
+    Return True only if the query is provably a single read-only statement.
+
+    The check is deliberately conservative: a keyword that could write or take
+    locks anywhere outside a string literal disqualifies the statement.
+    """
+    normalized = normalize_sql(query)
+    if not normalized.startswith(READ_ONLY_PREFIXES):
+        return False
+
+    unquoted = ' '.join(text for text, is_quoted in _split_quoted(normalized) if not is_quoted)
+    if ';' in unquoted:
+        return False
+    return not WRITE_PATTERN.search(unquoted)
+
+def is_cacheable(query):
+    """
+    Return True if a query's result depends only on the tables it reads.
+
+    Besides being read-only, the query may only call functions known to be
+    deterministic and must not read the clock, the session or the system
+    catalogs, none of which the state token tracks.
+    """
+    if not is_read_only(query):
+        return False
+    unquoted = ' '.join(text for text, is_quoted in _split_quoted(normalize_sql(query)) if not is_quoted)
+    if VOLATILE_PATTERN.search(unquoted):
+        return False
+    called = set(FUNCTION_CALL_PATTERN.findall(unquoted)) - PARENTHESIZED_KEYWORDS
+    return called <= CACHEABLE_FUNCTIONS
+
+def referenced_identifiers(normalized_query):
+    """Collect every identifier that could name a relation in a normalized query"""
+    identifiers = set()
+    for text, is_quoted in _split_quoted(normalized_query):
+        if is_quoted and not text.startswith('"'):
+            continue
+        for quoted, bare in IDENTIFIER_PATTERN.findall(text):
+            identifiers.add(quoted.replace('""', '"') if quoted else bare)
+    return identifiers
+
+def _estimate_size(value):
+    """Rough in-memory size of a cached result in bytes"""
+    if hasattr(value, 'memory_usage'):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+class ResultCache:
+    """
+    Cache for the results of read-only queries.
+
+    Entries are keyed by normalized SQL text plus a database-state token. The
+    token is built from the modification counters of the tables a query touches
+    (or from ``snapshot_id`` when one is supplied), so a write to any of those
+    tables yields a new key and the stale entry is dropped on the next lookup.
+
+    Note that ``pg_stat_user_tables`` counters are published asynchronously and
+    may trail a commit by up to a second. Pass ``snapshot_id`` when strict
+    consistency against concurrent writers is required.
+
+    Results are held in an in-memory LRU bounded by ``max_memory_bytes``.
+    Results larger than ``spill_threshold_bytes``, and entries evicted from
+    memory, are written to ``spill_dir`` if one is configured. Spilled entries
+    survive across runs since their file names are derived from the key, and
+    the least recently used files are deleted once they exceed
+    ``max_spill_bytes``.
+
+    Only queries accepted by ``is_cacheable`` that reference at least one
+    tracked table are cached, and they run in a READ ONLY transaction so the
+    server rejects any write the checks missed.
+    """
+
+    def __init__(self, max_memory_bytes=256 * 1024 * 1024, spill_dir=None,
+                 spill_threshold_bytes=16 * 1024 * 1024, snapshot_id=None,
+                 max_spill_bytes=1024 * 1024 * 1024):
+        self.max_memory_bytes = max_memory_bytes
+        self.spill_dir = spill_dir
+        self.spill_threshold_bytes = spill_threshold_bytes
+        self.snapshot_id = snapshot_id
+        self.max_spill_bytes = max_spill_bytes
+
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        # Spill files in least recently used order: key -> (size, normalized query)
+        self._spilled = OrderedDict()
+        self._spill_bytes = 0
+        self._latest_keys = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._index_spill_dir()
+
+    def _index_spill_dir(self):
+        """Pick up the spill files of earlier runs, oldest first, and trim them to the cap"""
+        files = []
+        for name in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, name)
+            if name.endswith('.pkl'):
+                files.append((os.path.getmtime(path), name[:-len('.pkl')], os.path.getsize(path)))
+            elif name.endswith('.tmp'):
+                # Left behind by an interrupted write
+                os.remove(path)
+        for _, key, size in sorted(files):
+            self._spilled[key] = (size, None)
+            self._spill_bytes += size
+        with self._lock:
+            evicted = self._trim_spilled()
+        self._remove_spill_files(evicted)
+
+    def get_state_token(self, normalized_query, db=None):
+        """
+        Build the database-state token for the relations a query references.
+
+        Returns None when the token cannot be read or the query references no
+        tracked table or view, since nothing would then invalidate its result.
+        """
+        db = get_database(db)
+        if self.snapshot_id is not None:
+            return f"snapshot:{self.snapshot_id}"
+
+        conn = db.get_connection()
+        if not conn:
+            return None
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute(STATE_QUERY)
+            rows = cursor.fetchall()
+        except Exception as e:
+            print(f"Error reading table statistics: {e}")
+            return None
+        finally:
+            cursor.close()
+            db.release_connection(conn)
+
+        identifiers = referenced_identifiers(normalized_query)
+        epoch = next((counters for kind, _, counters in rows if kind == 'epoch'), None)
+        tables = {name: counters for kind, name, counters in rows if kind == 'table'}
+        views = {name for kind, name, _ in rows if kind == 'view'}
+
+        # The tables behind a view are unknown here, so any write invalidates
+        if identifiers & views:
+            touched = sorted(tables.items())
+        else:
+            touched = sorted((name, counters) for name, counters in tables.items() if name in identifiers)
+        if not touched:
+            return None
+
+        return f"epoch={epoch}," + ','.join(f"{name}={counters}" for name, counters in touched)
+
+    def _make_key(self, normalized_query, token):
+        return hashlib.sha256(f"{token}\x00{normalized_query}".encode('utf-8')).hexdigest()
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, f"{key}.pkl")
+
+    def _drop(self, key):
+        """Remove a key from both tiers. Caller must hold the lock."""
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[1]
+            self._forget(entry[2], key)
+        spilled = self._spilled.pop(key, None)
+        if spilled is not None:
+            self._spill_bytes -= spilled[0]
+            if spilled[1] is not None:
+                self._forget(spilled[1], key)
+        if self.spill_dir:
+            self._remove_spill_files([key])
+
+    def _forget(self, normalized_query, key):
+        """Drop the latest-key record for a query if it still points at key. Caller must hold the lock."""
+        if self._latest_keys.get(normalized_query) == key:
+            del self._latest_keys[normalized_query]
+
+    def _trim_spilled(self):
+        """Evict spill files until they fit max_spill_bytes. Caller must hold the lock."""
+        evicted = []
+        while self._spilled and self._spill_bytes > self.max_spill_bytes:
+            key, (size, normalized_query) = self._spilled.popitem(last=False)
+            self._spill_bytes -= size
+            if normalized_query is not None:
+                self._forget(normalized_query, key)
+            evicted.append(key)
+        return evicted
+
+    def _remove_spill_files(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._spill_path(key))
+            except FileNotFoundError:
+                pass
+
+    def _spill(self, key, value, normalized_query):
+        """Write an entry to disk; it is forgotten if that fails"""
+        if not self.spill_dir:
+            with self._lock:
+                self._forget(normalized_query, key)
+            return False
+        path = self._spill_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except Exception as e:
+            print(f"Error spilling cached result to {path}: {e}")
+            with self._lock:
+                self._forget(normalized_query, key)
+            return False
+
+        with self._lock:
+            previous = self._spilled.pop(key, None)
+            if previous is not None:
+                self._spill_bytes -= previous[0]
+            self._spilled[key] = (size, normalized_query)
+            self._spill_bytes += size
+            evicted = self._trim_spilled()
+        self._remove_spill_files(evicted)
+        return True
+
+    def _load_spilled(self, key):
+        if not self.spill_dir:
+            return None
+        try:
+            with open(self._spill_path(key), 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error reading spilled result {key}: {e}")
+            return None
+
+    def get(self, normalized_query, token):
+        """Look up a cached result, dropping any entry made under an older token"""
+        key = self._make_key(normalized_query, token)
+        with self._lock:
+            previous_key = self._latest_keys.get(normalized_query)
+            if previous_key is not None and previous_key != key:
+                self._drop(previous_key)
+                self._latest_keys.pop(normalized_query, None)
+
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        value = self._load_spilled(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                if key in self._spilled:
+                    # Files from earlier runs are indexed without their query
+                    self._spilled[key] = (self._spilled[key][0], normalized_query)
+                    self._spilled.move_to_end(key)
+                    self._latest_keys[normalized_query] = key
+                self.hits += 1
+        return value
+
+    def put(self, normalized_query, token, value):
+        """Store a result in memory, or on disk if it is too large"""
+        key = self._make_key(normalized_query, token)
+        size = _estimate_size(value)
+        evicted = []
+
+        with self._lock:
+            previous_key = self._latest_keys.get(normalized_query)
+            if previous_key is not None and previous_key != key:
+                self._drop(previous_key)
+            self._latest_keys[normalized_query] = key
+
+            if size <= self.spill_threshold_bytes and size <= self.max_memory_bytes:
+                if key in self._memory:
+                    self._memory_bytes -= self._memory.pop(key)[1]
+                self._memory[key] = (value, size, normalized_query)
+                self._memory_bytes += size
+                while self._memory_bytes > self.max_memory_bytes:
+                    old_key, (old_value, old_size, old_query) = self._memory.popitem(last=False)
+                    self._memory_bytes -= old_size
+                    evicted.append((old_key, old_value, old_query))
+                value = None
+
+        # Disk writes happen outside the lock. Only entries held in memory or
+        # on disk are tracked, so the latest-key map stays as bounded as the
+        # two tiers.
+        if value is not None:
+            self._spill(key, value, normalized_query)
+        for old_key, old_value, old_query in evicted:
+            self._spill(old_key, old_value, old_query)
+
+    def execute(self, query, fetch=True, db=None):
+        """
+        Drop-in replacement for ``database.execute_query``.
+
+        Only cacheable statements that return rows are cached; everything else,
+        including errors, is passed straight through.
+        """
+        db = get_database(db)
+        if not fetch or not is_cacheable(query):
+            return execute_query(query, fetch, db)
+
+        normalized = normalize_sql(query)
+        token = self.get_state_token(normalized, db)
+        if token is None:
+            return execute_query(query, fetch, db, read_only=True)
+
+        # Entries are scoped per database so tenants never share results
+        scoped_query = f"{db.key}\x00{normalized}"
+        cached = self.get(scoped_query, token)
+        if cached is not None:
+            return cached.copy() if hasattr(cached, 'copy') else cached
+
+        result = execute_query(query, fetch, db, read_only=True)
+        if not isinstance(result, str):
+            self.put(scoped_query, token, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "spill_entries": len(self._spilled),
+                "spill_bytes": self._spill_bytes
+            }
+
+if __name__ == "__main__":
+    cache = ResultCache()
+    query = "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'"
+    print(f"Read-only: {is_read_only(query)}")
+    print(cache.execute(query))
+    print(cache.execute(query))
+    print(cache.stats())
@@ -0,0 +1,126 @@
+"""
+Per-item storage for query execution results.
+
+Instead of keeping every DataFrame in memory and stringifying it into a CSV
+cell, each result is written to its own Arrow IPC file and the results file
+only keeps a small summary that references it. Arrow IPC files are read back
+through a memory map, so analysis does not copy the data into Python objects.
+
+pyarrow is optional. Without it results are written as pandas pickles, which
+can still be read back but are not memory-mapped.
+"""
+
+import os
+import json
+import uuid
+import threading
+
+ARROW_EXTENSION = ".arrow"
+PICKLE_EXTENSION = ".pkl"
+
+def _has_pyarrow():
+    try:
+        import pyarrow
+        return True
+    except ImportError:
+        return False
+
+def _to_arrow_table(df):
+    import pyarrow as pa
+
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # Columns of mixed Python types have no Arrow equivalent
+        return pa.Table.from_pandas(df.astype(str), preserve_index=False)
+
+def load_result(path, as_pandas=False):
+    """
+    Load a stored execution result.
+
+    Arrow files are memory-mapped and returned as a zero-copy pyarrow Table.
+    Pass as_pandas=True to get a DataFrame instead, which does copy.
+    """
+    if path.endswith(ARROW_EXTENSION):
+        import pyarrow as pa
+
+        with pa.memory_map(path, 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas() if as_pandas else table
+
+    import pandas as pd
+    return pd.read_pickle(path)
+
+class ResultStore:
+    """Writes each DataFrame execution result to its own file under a directory"""
+
+    def __init__(self, directory, prefix="result"):
+        self.directory = directory
+        self.prefix = prefix
+        # Summaries outlive the run through the query cache, so ids must never
+        # be reused by a later run writing to the same directory
+        self.run_id = uuid.uuid4().hex[:12]
+        self.use_arrow = _has_pyarrow()
+        self._counter = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        if not self.use_arrow:
+            print("pyarrow is not installed; execution results will be stored as pickles")
+
+    def _next_id(self):
+        with self._lock:
+            self._counter += 1
+            return f"{self.prefix}-{self.run_id}-{self._counter:06d}"
+
+    def path_for(self, result_id):
+        extension = ARROW_EXTENSION if self.use_arrow else PICKLE_EXTENSION
+        return os.path.join(self.directory, result_id + extension)
+
+    def save(self, df):
+        """Write a DataFrame and return the summary that replaces it in memory"""
+        result_id = self._next_id()
+        path = self.path_for(result_id)
+        tmp_path = path + ".tmp"
+
+        if self.use_arrow:
+            import pyarrow as pa
+
+            table = _to_arrow_table(df)
+            # Uncompressed so the file can be memory-mapped without decoding
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+        else:
+            df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+
+        return {
+            "execution_result_id": result_id,
+            "execution_result_path": path,
+            "execution_result_rows": len(df),
+            "execution_result_columns": json.dumps([str(column) for column in df.columns])
+        }
+
+    def spill(self, result):
+        """
+        Replace a DataFrame execution result in a result dict with its summary.
+
+        Messages and errors returned as strings are small and are kept inline.
+        """
+        execution_result = result.get("execution_result")
+        if execution_result is None or isinstance(execution_result, str):
+            return result
+        result = dict(result)
+        del result["execution_result"]
+        result.update(self.save(execution_result))
+        return result
+
+    def load(self, result_id, as_pandas=False):
+        return load_result(self.path_for(result_id), as_pandas)
+
+if __name__ == "__main__":
+    import sys
+
+    # Inspect a stored result: python result_store.py <path>
+    table = load_result(sys.argv[1])
+    print(table)
@@ -0,0 +1,244 @@
+"""
+Execution sandbox for generated and corrected SQL.
+
+Every call runs its statements inside one transaction that is always rolled
+back, so validating a corrected INSERT, UPDATE, DELETE or DDL statement, or a
+SELECT that calls a function with side effects, never changes the database.
+The status of each statement (e.g. "UPDATE 3"), its row count and any rows it
+returns, such as RETURNING output, are captured before the rollback.
+
+Row locks taken by a sandboxed write are held until the rollback, so workers
+writing the same rows on a shared database still wait on each other. With
+TemplateClones each worker instead gets its own copy of a template database
+and never contends with the others.
+
+A few effects are not transactional in PostgreSQL and survive the rollback,
+most notably sequence increments from nextval() and serial columns.
+"""
+
+import os
+import re
+import queue
+import threading
+from database import Database, get_database
+
+# Splits SQL at top-level semicolons, skipping literals, quoted identifiers,
+# dollar-quoted bodies and comments
+TOKEN_PATTERN = re.compile(
+    r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\$(\w*)\$.*?\$\1\$|--[^\n]*|/\*.*?\*/|;",
+    re.DOTALL
+)
+LEADING_COMMENTS = re.compile(r'^(?:\s+|--[^\n]*|/\*.*?\*/)*', re.DOTALL)
+
+# These would end the sandbox transaction and let later statements commit
+TRANSACTION_CONTROL = re.compile(
+    r'(begin|start\s+transaction|commit|end|rollback|abort|savepoint|release|'
+    r'prepare\s+transaction)\b',
+    re.IGNORECASE
+)
+
+def split_statements(query):
+    """Split a SQL script into its statements, without trailing semicolons"""
+    statements = []
+    start = 0
+    for match in TOKEN_PATTERN.finditer(query):
+        if match.group(0) == ';':
+            statements.append(query[start:match.start()])
+            start = match.end()
+    statements.append(query[start:])
+    return [statement.strip() for statement in statements
+            if LEADING_COMMENTS.sub('', statement).strip()]
+
+def is_transaction_control(statement):
+    return bool(TRANSACTION_CONTROL.match(LEADING_COMMENTS.sub('', statement)))
+
+class Sandbox:
+    """
+    Runs SQL in transactions that are always rolled back.
+
+    Args:
+        statement_timeout_ms: Upper bound on each statement's run time
+        lock_timeout_ms: How long a statement waits for a row or table lock
+            held by another worker before failing
+        clones: Optional TemplateClones; statements then run on a per-worker
+            clone instead of the target database
+    """
+
+    def __init__(self, statement_timeout_ms=30000, lock_timeout_ms=5000, clones=None):
+        self.statement_timeout_ms = statement_timeout_ms
+        self.lock_timeout_ms = lock_timeout_ms
+        self.clones = clones
+
+    def run(self, query, db=None):
+        """
+        Run every statement of a script in one rolled-back transaction.
+
+        Statements run in order and stop at the first error, as they would
+        outside the sandbox.
+
+        Returns:
+            dict: "statements", one entry per statement run with its
+                  "statement", "status", "rowcount" and "rows" (a DataFrame,
+                  or None when it returns no rows), and "error", the first
+                  error message or None
+        """
+        statements = split_statements(query)
+        control = [statement for statement in statements if is_transaction_control(statement)]
+        if control:
+            return {"statements": [], "error": f"Transaction control is not allowed in the sandbox: {control[0]}"}
+        if self.clones:
+            with self.clones.checkout() as clone:
+                return self._run_statements(statements, clone)
+        return self._run_statements(statements, get_database(db))
+
+    def _run_statements(self, statements, db):
+        import pandas as pd
+
+        outcome = {"statements": [], "error": None}
+        conn = db.get_connection()
+        if not conn:
+            outcome["error"] = "Failed to connect to database"
+            return outcome
+
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            # SET LOCAL only lasts until the rollback below
+            cursor.execute(f"SET LOCAL statement_timeout = {int(self.statement_timeout_ms)}")
+            cursor.execute(f"SET LOCAL lock_timeout = {int(self.lock_timeout_ms)}")
+            for statement in statements:
+                try:
+                    cursor.execute(statement)
+                except Exception as e:
+                    outcome["error"] = str(e).strip()
+                    break
+                rows = None
+                if cursor.description is not None:
+                    colnames = [desc[0] for desc in cursor.description]
+                    rows = pd.DataFrame(cursor.fetchall(), columns=colnames)
+                outcome["statements"].append({
+                    "statement": statement,
+                    "status": cursor.statusmessage,
+                    "rowcount": cursor.rowcount,
+                    "rows": rows
+                })
+        except Exception as e:
+            outcome["error"] = str(e).strip()
+        finally:
+            try:
+                conn.rollback()
+            finally:
+                if cursor is not None:
+                    cursor.close()
+                db.release_connection(conn)
+        return outcome
+
+    def execute(self, query, db=None):
+        """
+        Drop-in replacement for ``database.execute_query`` that never commits.
+
+        Returns the rows of the last statement that returned any, or else a
+        message with the status of each statement. Errors are raised as
+        RuntimeError rather than returned as text.
+        """
+        outcome = self.run(query, db)
+        if outcome["error"]:
+            raise RuntimeError(f"Error executing query: {outcome['error']}")
+        for statement in reversed(outcome["statements"]):
+            if statement["rows"] is not None:
+                return statement["rows"]
+        statuses = "; ".join(statement["status"] or "" for statement in outcome["statements"])
+        rows_affected = sum(max(statement["rowcount"], 0) for statement in outcome["statements"])
+        return f"Query executed successfully and rolled back ({statuses}). Rows affected: {rows_affected}"
+
+    def error_message(self, query, db=None):
+        """Return the error a query fails with, or None, without keeping any change"""
+        return self.run(query, db)["error"]
+
+class TemplateClones:
+    """
+    Private databases cloned from a template, one per concurrent worker.
+
+    The template must be a database nobody else is connected to, because
+    PostgreSQL refuses to copy a database with open connections. Create one
+    once from the working database, e.g.
+    ``CREATE DATABASE "dataH_template" TEMPLATE "dataH"``.
+
+    Clones are created with CREATE DATABASE ... TEMPLATE, which copies files
+    rather than replaying data, and dropped by close().
+
+    Args:
+        template: Name of the template database
+        count: Number of clones, normally the number of worker threads
+        db: Any database on the same server, used for its connection settings
+    """
+
+    def __init__(self, template, count, db=None):
+        self.template = template
+        self.count = count
+        self.base = get_database(db)
+        self.names = [f"ignis_sandbox_{os.getpid()}_{i}" for i in range(count)]
+        self._free = queue.Queue()
+        self._created = {}
+        self._lock = threading.Lock()
+
+    def _clone_database(self, name):
+        if self.base.dsn:
+            from psycopg2.extensions import make_dsn
+            return Database(dsn=make_dsn(self.base.dsn, dbname=name), maxconn=1)
+        return Database(config={**self.base.config, 'database': name}, maxconn=1)
+
+    def _admin_command(self, sql):
+        # CREATE and DROP DATABASE cannot run inside a transaction
+        conn = self.base._connect()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+        finally:
+            conn.close()
+
+    def create(self):
+        """Create every clone; returns False if any could not be created"""
+        with self._lock:
+            for name in self.names:
+                if name in self._created:
+                    continue
+                try:
+                    self._admin_command(f'CREATE DATABASE "{name}" TEMPLATE "{self.template}"')
+                except Exception as e:
+                    print(f"Error cloning {self.template} into {name}: {e}")
+                    return False
+                clone = self._clone_database(name)
+                self._created[name] = clone
+                self._free.put(clone)
+        print(f"Created {len(self._created)} sandbox databases from {self.template}")
+        return True
+
+    def checkout(self):
+        """Context manager that lends one clone to the calling worker"""
+        return _Checkout(self._free)
+
+    def close(self):
+        """Close and drop every clone"""
+        with self._lock:
+            created, self._created = self._created, {}
+            self._free = queue.Queue()
+        for name, clone in created.items():
+            clone.close()
+            try:
+                self._admin_command(f'DROP DATABASE IF EXISTS "{name}"')
+            except Exception as e:
+                print(f"Error dropping sandbox database {name}: {e}")
+
+class _Checkout:
+    def __init__(self, free):
+        self.free = free
+
+    def __enter__(self):
+        self.clone = self.free.get()
+        return self.clone
+
+    def __exit__(self, *exc_info):
+        self.free.put(self.clone)
+        return False
@@ -1,12 +1,43 @@
-import pandas as pd
-from database import get_connection
+import csv
+from database import get_database
 
-def get_schema_info():
+# Columns with at most this many distinct values get sample values in the prompt
+LOW_CARDINALITY_LIMIT = 20
+MAX_SAMPLE_VALUES = 10
+TEXT_TYPES = ("character varying", "text", "character", "USER-DEFINED")
+
+def _fetch_optional(conn, cursor, query, params=None):
+    """Run a statistics query; these are nice to have, so failures only cost the hint"""
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    except Exception as e:
+        conn.rollback()
+        print(f"Skipping schema statistics: {e}")
+        return []
+
+def _parse_array_text(text):
+    """Parse the text form of a PostgreSQL array such as {a,b,"c d"}"""
+    inner = text.strip()[1:-1]
+    if not inner:
+        return []
+    values = next(csv.reader([inner], quotechar='"', escapechar='\\'))
+    return [value for value in values if value != 'NULL']
+
+def sql_literal(value):
+    """Render a value as a SQL string literal, doubling embedded quotes"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+def get_schema_info(db=None):
     """
     Extract the database schema information including tables, columns, data types, 
-    primary keys, foreign keys, and relationships.
+    primary keys, foreign keys, and relationships, plus estimated row counts,
+    index definitions, enum labels and sample values of low-cardinality columns.
+
+    Every piece is fetched with one set-based query rather than per table.
     """
-    conn = get_connection()
+    db = get_database(db)
+    conn = db.get_connection()
     if not conn:
         return "Failed to connect to database"
     
@@ -16,55 +47,47 @@ def get_schema_info():
             "relationships": []
         }
         
+        cursor = conn.cursor()
+        
         # Get all tables
-        tables_query = """
+        cursor.execute("""
         SELECT table_name
         FROM information_schema.tables
         WHERE table_schema = 'public'
-        """
-        
-        cursor = conn.cursor()
-        cursor.execute(tables_query)
-        tables = [table[0] for table in cursor.fetchall()]
+        """)
+        tables = {table[0]: {"name": table[0], "columns": [], "primary_keys": [], "indexes": []}
+                  for table in cursor.fetchall()}
         
-        # For each table, get columns with their data types
-        for table in tables:
-            table_info = {"name": table, "columns": []}
-            
-            # Get columns
-            columns_query = f"""
-            SELECT column_name, data_type, is_nullable
-            FROM information_schema.columns
-            WHERE table_schema = 'public' AND table_name = '{table}'
-            ORDER BY ordinal_position
-            """
-            
-            cursor.execute(columns_query)
-            columns = cursor.fetchall()
-            
-            for column in columns:
-                column_name, data_type, is_nullable = column
-                table_info["columns"].append({
+        # Get columns with their data types for all tables
+        cursor.execute("""
+        SELECT table_name, column_name, data_type, is_nullable, udt_name
+        FROM information_schema.columns
+        WHERE table_schema = 'public'
+        ORDER BY table_name, ordinal_position
+        """)
+        for table_name, column_name, data_type, is_nullable, udt_name in cursor.fetchall():
+            if table_name in tables:
+                tables[table_name]["columns"].append({
                     "name": column_name,
                     "type": data_type,
+                    "udt_name": udt_name,
                     "nullable": is_nullable
                 })
-            
-            # Get primary key
-            pk_query = f"""
-            SELECT c.column_name
-            FROM information_schema.table_constraints tc
-            JOIN information_schema.constraint_column_usage AS ccu USING (constraint_schema, constraint_name)
-            JOIN information_schema.columns AS c ON c.table_schema = tc.constraint_schema
-              AND tc.table_name = c.table_name AND ccu.column_name = c.column_name
-            WHERE tc.constraint_type = 'PRIMARY KEY' AND tc.table_name = '{table}'
-            """
-            
-            cursor.execute(pk_query)
-            pks = [pk[0] for pk in cursor.fetchall()]
-            table_info["primary_keys"] = pks
-            
-            schema_info["tables"].append(table_info)
+        
+        # Get primary keys for all tables
+        cursor.execute("""
+        SELECT tc.table_name, kcu.column_name
+        FROM information_schema.table_constraints tc
+        JOIN information_schema.key_column_usage kcu
+          ON tc.constraint_name = kcu.constraint_name
+          AND tc.table_schema = kcu.table_schema
+          AND tc.table_name = kcu.table_name
+        WHERE tc.constraint_type = 'PRIMARY KEY' AND tc.table_schema = 'public'
+        ORDER BY tc.table_name, kcu.ordinal_position
+        """)
+        for table_name, column_name in cursor.fetchall():
+            if table_name in tables:
+                tables[table_name]["primary_keys"].append(column_name)
         
         # Get foreign keys (relationships)
         fk_query = """
@@ -96,6 +119,73 @@ def get_schema_info():
                 "referenced_column": referenced_column_name
             })
         
+        # Estimated row counts; reltuples is -1 (or 0) for tables never analyzed
+        for table_name, row_estimate in _fetch_optional(conn, cursor, """
+        SELECT c.relname, c.reltuples::bigint
+        FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'm')
+        """):
+            if table_name in tables and row_estimate > 0:
+                tables[table_name]["row_estimate"] = row_estimate
+        
+        # Index key columns one by one, so INCLUDE columns and partial index
+        # predicates never end up in the key list
+        for table_name, columns, method, unique, primary, predicate in _fetch_optional(conn, cursor, """
+        SELECT t.relname,
+               ARRAY(SELECT pg_get_indexdef(i.indexrelid, k, true)
+                     FROM generate_series(1, i.indnkeyatts) AS k ORDER BY k),
+               am.amname, i.indisunique, i.indisprimary,
+               pg_get_expr(i.indpred, i.indrelid, true)
+        FROM pg_index i
+        JOIN pg_class t ON t.oid = i.indrelid
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_am am ON am.oid = c.relam
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        WHERE n.nspname = 'public'
+        """):
+            if table_name in tables:
+                tables[table_name]["indexes"].append({
+                    "columns": ", ".join(columns),
+                    "method": method,
+                    "unique": unique,
+                    "primary": primary,
+                    "predicate": predicate
+                })
+        
+        # Enum labels by type name
+        enums = {}
+        for type_name, label in _fetch_optional(conn, cursor, """
+        SELECT t.typname, e.enumlabel
+        FROM pg_type t
+        JOIN pg_enum e ON e.enumtypid = t.oid
+        JOIN pg_namespace n ON n.oid = t.typnamespace
+        WHERE n.nspname = 'public'
+        ORDER BY t.typname, e.enumsortorder
+        """):
+            enums.setdefault(type_name, []).append(label)
+        
+        # Most common values of low-cardinality columns. A negative n_distinct
+        # is a fraction of the row count rather than a count.
+        common_values = {}
+        for table_name, column_name, n_distinct, values in _fetch_optional(conn, cursor, """
+        SELECT tablename, attname, n_distinct, most_common_vals::text
+        FROM pg_stats
+        WHERE schemaname = 'public' AND most_common_vals IS NOT NULL
+        """):
+            if table_name not in tables:
+                continue
+            distinct = n_distinct if n_distinct > 0 else -n_distinct * tables[table_name].get("row_estimate", 0)
+            if 0 < distinct <= LOW_CARDINALITY_LIMIT:
+                common_values[(table_name, column_name)] = _parse_array_text(values)[:MAX_SAMPLE_VALUES]
+        
+        for table in tables.values():
+            for column in table["columns"]:
+                if column["udt_name"] in enums:
+                    column["enum_values"] = enums[column["udt_name"]]
+                elif column["type"] in TEXT_TYPES and (table["name"], column["name"]) in common_values:
+                    column["common_values"] = common_values[(table["name"], column["name"])]
+        
+        schema_info["tables"] = list(tables.values())
         return schema_info
     
     except Exception as e:
@@ -104,31 +194,67 @@ def get_schema_info():
     
     finally:
         cursor.close()
-        conn.close()
+        db.release_connection(conn)
 
-def format_schema_for_prompt():
-    """Format the schema information into a string for inclusion in LLM prompts"""
-    schema_info = get_schema_info()
+def format_schema_for_prompt(refresh=False, db=None):
+    """
+    Format the schema information into a string for inclusion in LLM prompts.
+
+    The formatted schema is extracted once per database and cached on its
+    handle, so every caller shares it. Pass refresh=True to re-extract it
+    after the schema has changed.
+    """
+    db = get_database(db)
+    with db.schema_lock:
+        if db.schema_prompt is None or refresh:
+            prompt_text = _build_schema_prompt(db)
+            # Failures are not cached so the next caller retries
+            if prompt_text is None:
+                return "Could not retrieve schema information"
+            db.schema_prompt = prompt_text
+        return db.schema_prompt
+
+def _build_schema_prompt(db):
+    schema_info = get_schema_info(db)
     if not schema_info or isinstance(schema_info, str):
-        return "Could not retrieve schema information"
+        return None
     
     prompt_text = "Database Schema:\n\n"
     
     # Add tables and columns
     for table in schema_info["tables"]:
-        prompt_text += f"Table: {table['name']}\n"
+        prompt_text += f"Table: {table['name']}"
+        if "row_estimate" in table:
+            prompt_text += f" (~{table['row_estimate']} rows)"
+        prompt_text += "\n"
         prompt_text += "Columns:\n"
         
         for column in table["columns"]:
             nullable = "NULL" if column["nullable"] == "YES" else "NOT NULL"
-            prompt_text += f"  - {column['name']} ({column['type']}, {nullable})"
+            column_type = column["udt_name"] if column["type"] == "USER-DEFINED" else column["type"]
+            prompt_text += f"  - {column['name']} ({column_type}, {nullable})"
             
             # Mark primary keys
             if "primary_keys" in table and column["name"] in table["primary_keys"]:
                 prompt_text += " PRIMARY KEY"
             
+            # Valid literals for enum and low-cardinality columns
+            if "enum_values" in column:
+                prompt_text += " one of: " + ", ".join(sql_literal(value) for value in column["enum_values"])
+            elif "common_values" in column:
+                prompt_text += " common values: " + ", ".join(sql_literal(value) for value in column["common_values"])
+            
             prompt_text += "\n"
         
+        # The primary key index is already implied by PRIMARY KEY above
+        indexes = [index for index in table.get("indexes", []) if not index["primary"]]
+        if indexes:
+            rendered = [("UNIQUE " if index["unique"] else "") + f"({index['columns']})"
+                        + ("" if index["method"] == "btree" else f" {index['method']}")
+                        + (f" WHERE {index['predicate']}" if index["predicate"] else "")
+                        for index in indexes]
+            prompt_text += f"Indexes: {', '.join(rendered)}\n"
+        
         prompt_text += "\n"
     
     # Add relationships
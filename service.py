@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import argparse
+import threading
+import socketserver
+import concurrent.futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from database import init_pool, close_pool, configure_tenants, get_database
+from groq_client import GroqClient, RateLimiter
+from nl_to_sql import NLtoSQLConverter
+from sql_corrector import SQLCorrector
+from result_cache import ResultCache
+from query_cache import QueryCache
+from schema_extractor import format_schema_for_prompt
+from sandbox import Sandbox
+
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+def to_jsonable(value):
+    """Convert execution results into something json.dumps can handle"""
+    if hasattr(value, 'to_dict') and hasattr(value, 'columns'):
+        split = value.to_dict(orient='split')
+        return {"columns": split["columns"], "rows": split["data"]}
+    if isinstance(value, dict):
+        return {key: to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    return value
+
+class IgnisService:
+    """
+    Warm, shared state for the service: one Groq client and rate limiter, a
+    pool and extracted schema per database, and the query and result caches.
+    All methods are safe to call from concurrent request threads.
+    """
+
+    def __init__(self, max_workers=8, pool_size=10, requests_per_minute=None,
+                 result_cache_mb=256, result_cache_dir=None, max_tenants=32,
+                 tenant_idle_timeout=600, tenant_pool_size=5, sandbox=False,
+                 query_cache_entries=10000, result_cache_disk_mb=1024):
+        self.started_at = time.time()
+        init_pool(1, pool_size)
+        self.tenants = configure_tenants(max_tenants, tenant_idle_timeout, tenant_pool_size)
+
+        rate_limiter = RateLimiter(requests_per_minute) if requests_per_minute else None
+        self.groq_client = GroqClient(rate_limiter=rate_limiter)
+        self.result_cache = ResultCache(
+            max_memory_bytes=result_cache_mb * 1024 * 1024,
+            spill_dir=result_cache_dir,
+            max_spill_bytes=result_cache_disk_mb * 1024 * 1024
+        )
+        self.query_cache = QueryCache(max_entries=query_cache_entries)
+        # Executed statements that could write are rolled back, so clients can
+        # validate DML and DDL without changing the database
+        self.sandbox = Sandbox() if sandbox else None
+
+        # Both share the process-wide schema, so it is extracted once here
+        # instead of on the first request
+        self.converter = NLtoSQLConverter(self.groq_client, self.result_cache, sandbox=self.sandbox)
+        self.corrector = SQLCorrector(self.groq_client, self.result_cache, sandbox=self.sandbox)
+        format_schema_for_prompt()
+
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+
+    def _count_request(self):
+        with self._count_lock:
+            self.request_count += 1
+
+    def _cache_key(self, text, database):
+        # Different databases have different schemas, so their answers differ
+        return (get_database(database).key, text)
+
+    def nl_to_sql(self, nl_query, execute=False, database=None):
+        """Generate SQL against the default database, or a tenant DSN if given"""
+        self._count_request()
+        converter = self.converter
+        if database is not None:
+            converter = NLtoSQLConverter(self.groq_client, self.result_cache, database, sandbox=self.sandbox)
+        cache_key = self._cache_key(nl_query, database)
+        result = self.query_cache.get_nl_to_sql(cache_key)
+        if result is None:
+            result = converter.nl_to_sql(nl_query, execute=False)
+            self.query_cache.set_nl_to_sql(cache_key, result)
+        if execute:
+            # Cached results are shared, so the outcome goes on a copy
+            return converter.attach_execution(dict(result), result["generated_sql"])
+        return result
+
+    def correct_sql(self, incorrect_sql, execute=False, database=None):
+        """Correct SQL against the default database, or a tenant DSN if given"""
+        self._count_request()
+        corrector = self.corrector
+        if database is not None:
+            corrector = SQLCorrector(self.groq_client, self.result_cache, database, sandbox=self.sandbox)
+        cache_key = self._cache_key(incorrect_sql, database)
+        result = self.query_cache.get_sql_correction(cache_key)
+        if result is None:
+            result = corrector.correct_sql(incorrect_sql, execute=False)
+            self.query_cache.set_sql_correction(cache_key, result)
+        if execute:
+            return corrector.attach_execution(dict(result), result["corrected_sql"])
+        return result
+
+    def process_item(self, item, execute=False, database=None):
+        """Dispatch one batch item on whichever query field it carries"""
+        try:
+            execute = item.get("execute", execute)
+            database = item.get("database", database)
+            if "nl_query" in item:
+                return self.nl_to_sql(item["nl_query"], execute, database)
+            if "incorrect_sql" in item:
+                return self.correct_sql(item["incorrect_sql"], execute, database)
+            return {"error": "Item must contain 'nl_query' or 'incorrect_sql'"}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def batch(self, items, execute=False, database=None):
+        """Process items concurrently on the shared pool, returning results in input order"""
+        return list(self.executor.map(lambda item: self.process_item(item, execute, database), items))
+
+    def reload_schema(self, database=None):
+        db = get_database(database)
+        schema_info = format_schema_for_prompt(refresh=True, db=db)
+        # Answers generated against the old schema may no longer be valid
+        self.query_cache.discard(lambda key: key[0] == db.key)
+        return {"schema_length": len(schema_info)}
+
+    def health(self):
+        return {
+            "status": "ok",
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "requests": self.request_count,
+            "result_cache": self.result_cache.stats(),
+            "tenants": self.tenants.stats()
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        close_pool()
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def address_string(self):
+        # Unix socket peers have no host/port pair
+        if isinstance(self.client_address, tuple):
+            return super().address_string()
+        return "unix"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(to_jsonable(payload), default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_REQUEST_BYTES:
+            raise ValueError("Request body too large")
+        if not length:
+            return {}
+        payload = json.loads(self.rfile.read(length).decode('utf-8'))
+        if not isinstance(payload, dict):
+            raise ValueError("Request body must be a JSON object")
+        return payload
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, self.service.health())
+        else:
+            self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        try:
+            payload = self._read_json()
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {"error": f"Invalid request body: {e}"})
+            return
+
+        execute = bool(payload.get("execute", False))
+        # Optional DSN of a tenant database; the default database otherwise
+        database = payload.get("database")
+        try:
+            if self.path == "/nl_to_sql":
+                if "nl_query" not in payload:
+                    self._send_json(400, {"error": "Missing 'nl_query'"})
+                    return
+                self._send_json(200, self.service.nl_to_sql(payload["nl_query"], execute, database))
+            elif self.path == "/correct_sql":
+                if "incorrect_sql" not in payload:
+                    self._send_json(400, {"error": "Missing 'incorrect_sql'"})
+                    return
+                self._send_json(200, self.service.correct_sql(payload["incorrect_sql"], execute, database))
+            elif self.path == "/batch":
+                items = payload.get("items")
+                if not isinstance(items, list):
+                    self._send_json(400, {"error": "Missing 'items' list"})
+                    return
+                self._send_json(200, {"results": self.service.batch(items, execute, database)})
+            elif self.path == "/reload_schema":
+                self._send_json(200, self.service.reload_schema(database))
+            else:
+                self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def create_server(service, host="127.0.0.1", port=8765, unix_socket=None):
+    """Create an HTTP server over TCP, or over a Unix socket if a path is given"""
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = ThreadingUnixHTTPServer(unix_socket, ServiceRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='Run IgnisQL as a long-lived service with warm schema, pools and caches')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Host to bind the HTTP server to')
+    parser.add_argument('--port', type=int, default=8765, help='Port to bind the HTTP server to')
+    parser.add_argument('--unix-socket', type=str, default=None, help='Serve on this Unix socket path instead of TCP')
+    parser.add_argument('--max-workers', type=int, default=8, help='Worker threads for batch requests')
+    parser.add_argument('--pool-size', type=int, default=10, help='Maximum number of pooled database connections')
+    parser.add_argument('--requests-per-minute', type=int, default=None, help='Shared limit on LLM requests per minute')
+    parser.add_argument('--result-cache-mb', type=int, default=256, help='Maximum memory used by the result cache in megabytes')
+    parser.add_argument('--result-cache-disk-mb', type=int, default=1024, help='Maximum disk space used by spilled results in megabytes')
+    parser.add_argument('--result-cache-dir', type=str, default=None, help='Directory for spilling large or evicted cached results to disk')
+    parser.add_argument('--max-tenants', type=int, default=32, help='Maximum number of tenant databases kept open at once')
+    parser.add_argument('--tenant-idle-timeout', type=int, default=600, help='Seconds after which an idle tenant database is closed')
+    parser.add_argument('--tenant-pool-size', type=int, default=5, help='Maximum pooled connections per tenant database')
+    parser.add_argument('--query-cache-entries', type=int, default=10000, help='Maximum cached LLM results per task; the least recently used are evicted')
+    parser.add_argument('--sandbox', action='store_true', help='Roll back every executed statement instead of committing it')
+    args = parser.parse_args()
+
+    print("Warming up service state...")
+    start_time = time.time()
+    service = IgnisService(args.max_workers, args.pool_size, args.requests_per_minute,
+                           args.result_cache_mb, args.result_cache_dir, args.max_tenants,
+                           args.tenant_idle_timeout, args.tenant_pool_size, args.sandbox,
+                           args.query_cache_entries, args.result_cache_disk_mb)
+    server = create_server(service, args.host, args.port, args.unix_socket)
+    address = args.unix_socket or f"http://{args.host}:{args.port}"
+    print(f"Service ready in {time.time() - start_time:.2f} seconds, listening on {address}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down...")
+    finally:
+        server.server_close()
+        service.shutdown()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+
+if __name__ == "__main__":
+    main()
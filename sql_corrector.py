@@ -1,59 +1,18 @@
-import re
-from database import execute_query
-from schema_extractor import format_schema_for_prompt
-from groq_client import GroqClient
+from sql_processor import SQLProcessor
+from sandbox import Sandbox
 
-class SQLCorrector:
-    def __init__(self, groq_client=None):
-        """Initialize the SQL corrector"""
-        self.groq_client = groq_client or GroqClient()
-        self.schema_info = format_schema_for_prompt()
-    
-    def extract_sql_from_response(self, response):
-        """Extract the SQL query from the LLM response"""
-        # Try to extract SQL code block
-        sql_match = re.search(r'```sql\s*(.*?)\s*```', response, re.DOTALL)
-        if sql_match:
-            return sql_match.group(1).strip()
-        
-        # Try to extract any code block
-        code_match = re.search(r'```\s*(.*?)\s*```', response, re.DOTALL)
-        if code_match:
-            return code_match.group(1).strip()
-        
-        # If no code blocks, try to extract lines that look like SQL
-        sql_keywords = ['SELECT', 'FROM', 'WHERE', 'GROUP BY', 'ORDER BY', 
-                        'HAVING', 'JOIN', 'INNER JOIN', 'LEFT JOIN', 'RIGHT JOIN',
-                        'INSERT', 'UPDATE', 'DELETE', 'CREATE', 'ALTER', 'DROP']
-        
-        lines = response.split('\n')
-        sql_lines = []
-        is_sql = False
-        
-        for line in lines:
-            line_upper = line.strip().upper()
-            
-            # Check if the line starts with an SQL keyword
-            if any(line_upper.startswith(keyword) for keyword in sql_keywords):
-                is_sql = True
-                sql_lines.append(line)
-            # Continue if we're in an SQL block
-            elif is_sql and line.strip():
-                sql_lines.append(line)
-        
-        if sql_lines:
-            return '\n'.join(sql_lines)
-        
-        # If all else fails, return the original response
-        return response
+class SQLCorrector(SQLProcessor):
+    """Corrects SQL queries; the constructor arguments are described on SQLProcessor"""
     
     def get_error_message(self, sql_query):
-        """Execute the SQL query and get the error message if it fails"""
-        try:
-            execute_query(sql_query)
-            return None  # No error
-        except Exception as e:
-            return str(e)
+        """
+        Execute the SQL query and get the error message if it fails.
+
+        The query is only being diagnosed, so it always runs in a rolled-back
+        transaction and never changes the database.
+        """
+        sandbox = self.sandbox or Sandbox()
+        return sandbox.error_message(sql_query, self.db)
     
     def correct_sql(self, incorrect_sql, execute=False):
         """
@@ -86,13 +45,7 @@ class SQLCorrector:
         
         # Execute the corrected query if requested
         if execute:
-            try:
-                execution_result = execute_query(corrected_sql)
-                result["execution_success"] = True
-                result["execution_result"] = execution_result
-            except Exception as e:
-                result["execution_success"] = False
-                result["execution_error"] = str(e)
+            self.attach_execution(result, corrected_sql)
         
         return result
     
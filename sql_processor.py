@@ -0,0 +1,108 @@
+import re
+from database import execute_query, get_database
+from schema_extractor import format_schema_for_prompt
+from groq_client import GroqClient
+
+class SQLProcessor:
+    """
+    Shared plumbing of NLtoSQLConverter and SQLCorrector.
+
+    The Groq client and the schema are created on first use, so code paths
+    that never reach the LLM or the database do not pay for them.
+
+    Args:
+        db: The target database, as a DSN string or a database.Database
+            handle. Defaults to the database in database.DB_CONFIG.
+        sandbox: A sandbox.Sandbox; every executed statement is run in it
+            and rolled back instead of being committed.
+    """
+
+    def __init__(self, groq_client=None, result_cache=None, db=None, sandbox=None):
+        self._db = db
+        self._groq_client = groq_client
+        self._schema_info = None
+        self.result_cache = result_cache
+        self.sandbox = sandbox
+
+    @property
+    def db(self):
+        # Resolved on every use so an evicted tenant is re-registered, not orphaned
+        return get_database(self._db)
+
+    @property
+    def groq_client(self):
+        if self._groq_client is None:
+            self._groq_client = GroqClient()
+        return self._groq_client
+
+    @groq_client.setter
+    def groq_client(self, groq_client):
+        self._groq_client = groq_client
+
+    @property
+    def schema_info(self):
+        # The schema is extracted once per database and shared between instances
+        if self._schema_info is not None:
+            return self._schema_info
+        return format_schema_for_prompt(db=self.db)
+
+    @schema_info.setter
+    def schema_info(self, schema_info):
+        self._schema_info = schema_info
+
+    def execute_query(self, sql_query):
+        """Execute a query in the sandbox, or else through the result cache when one is configured"""
+        if self.sandbox:
+            return self.sandbox.execute(sql_query, self.db)
+        if self.result_cache:
+            return self.result_cache.execute(sql_query, db=self.db)
+        return execute_query(sql_query, db=self.db)
+
+    def attach_execution(self, result, sql_query):
+        """Execute a query and record its outcome in result"""
+        try:
+            execution_result = self.execute_query(sql_query)
+            result["execution_success"] = True
+            result["execution_result"] = execution_result
+        except Exception as e:
+            result["execution_success"] = False
+            result["execution_error"] = str(e)
+        return result
+
+    def extract_sql_from_response(self, response):
+        """Extract the SQL query from the LLM response"""
+        # Try to extract SQL code block
+        sql_match = re.search(r'```sql\s*(.*?)\s*```', response, re.DOTALL)
+        if sql_match:
+            return sql_match.group(1).strip()
+
+        # Try to extract any code block
+        code_match = re.search(r'```\s*(.*?)\s*```', response, re.DOTALL)
+        if code_match:
+            return code_match.group(1).strip()
+
+        # If no code blocks, try to extract lines that look like SQL
+        sql_keywords = ['SELECT', 'FROM', 'WHERE', 'GROUP BY', 'ORDER BY',
+                        'HAVING', 'JOIN', 'INNER JOIN', 'LEFT JOIN', 'RIGHT JOIN',
+                        'INSERT', 'UPDATE', 'DELETE', 'CREATE', 'ALTER', 'DROP']
+
+        lines = response.split('\n')
+        sql_lines = []
+        is_sql = False
+
+        for line in lines:
+            line_upper = line.strip().upper()
+
+            # Check if the line starts with an SQL keyword
+            if any(line_upper.startswith(keyword) for keyword in sql_keywords):
+                is_sql = True
+                sql_lines.append(line)
+            # Continue if we're in an SQL block
+            elif is_sql and line.strip():
+                sql_lines.append(line)
+
+        if sql_lines:
+            return '\n'.join(sql_lines)
+
+        # If all else fails, return the original response
+        return response
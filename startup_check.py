@@ -0,0 +1,84 @@
+"""
+Cold-start regression check for the entry points.
+
+Runs each entry point in a fresh interpreter with -X importtime, fails if a
+heavy dependency is imported at startup, and compares the import time and the
+wall-clock time against a budget. Exits non-zero on any failure.
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# These must only ever be imported on first use
+HEAVY_MODULES = ['pandas', 'numpy', 'groq', 'psycopg2', 'tqdm', 'httpx', 'pyarrow']
+
+# (name, arguments, import budget in ms, wall-clock budget in ms)
+CHECKS = [
+    ("import prompt", ["-c", "import prompt"], 100, 400),
+    ("main.py --help", ["main.py", "--help"], 150, 500),
+]
+
+IMPORTTIME_PATTERN = re.compile(r'^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)')
+
+def parse_importtime(stderr):
+    """Return {module: cumulative_us} and the total for top-level imports"""
+    modules = {}
+    total_us = 0
+    for line in stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, module = match.groups()
+        modules[module] = int(cumulative)
+        # Top-level imports are indented by a single space
+        if len(indent) == 1:
+            total_us += int(cumulative)
+    return modules, total_us
+
+def run_check(name, arguments, import_budget_ms, wall_budget_ms, scale=1.0):
+    start_time = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime"] + arguments,
+        cwd=HERE, capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - start_time) * 1000
+    modules, total_us = parse_importtime(process.stderr)
+    import_ms = total_us / 1000
+
+    failures = []
+    if process.returncode != 0:
+        failures.append(f"exited with status {process.returncode}")
+    heavy = [module for module in HEAVY_MODULES if module in modules]
+    if heavy:
+        failures.append(f"imported heavy modules at startup: {', '.join(heavy)}")
+    if import_ms > import_budget_ms * scale:
+        failures.append(f"imports took {import_ms:.1f} ms (budget {import_budget_ms * scale:.0f} ms)")
+    if wall_ms > wall_budget_ms * scale:
+        failures.append(f"startup took {wall_ms:.1f} ms (budget {wall_budget_ms * scale:.0f} ms)")
+
+    status = "FAIL" if failures else "ok"
+    print(f"[{status}] {name}: imports {import_ms:.1f} ms, wall {wall_ms:.1f} ms")
+    for failure in failures:
+        print(f"    - {failure}")
+    if failures:
+        slowest = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:5]
+        for module, cumulative in slowest:
+            print(f"      {cumulative / 1000:8.1f} ms  {module}")
+    return not failures
+
+def main():
+    parser = argparse.ArgumentParser(description='Check entry point cold-start time against a budget')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiply every time budget, for slow machines')
+    args = parser.parse_args()
+
+    results = [run_check(*check, scale=args.scale) for check in CHECKS]
+    sys.exit(0 if all(results) else 1)
+
+if __name__ == "__main__":
+    main()
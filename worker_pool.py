@@ -0,0 +1,44 @@
+"""
+Ordered thread pool shared by main.py and generate_json.py.
+
+Items run on a thread pool with a bounded number of calls in flight and their
+results come back in input order, so output files can be written as the run
+progresses.
+"""
+
+import concurrent.futures
+
+def process_in_order(items, worker, max_workers=4):
+    """
+    Run worker over items on a thread pool and yield (item, result) in input order.
+
+    At most 2 * max_workers calls are in flight. Results that finish ahead of
+    a slow item are held until it completes, but new items keep being
+    submitted meanwhile, so one straggler never idles the pool. A failed
+    item yields its exception as the result.
+    """
+    from tqdm import tqdm
+
+    max_in_flight = max_workers * 2
+    pending = {}
+    finished = {}
+    next_to_submit = next_to_yield = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor, \
+            tqdm(total=len(items)) as progress:
+        while next_to_yield < len(items):
+            while next_to_submit < len(items) and len(pending) < max_in_flight:
+                pending[executor.submit(worker, items[next_to_submit])] = next_to_submit
+                next_to_submit += 1
+
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    finished[index] = future.result()
+                except Exception as exc:
+                    finished[index] = exc
+                progress.update(1)
+
+            while next_to_yield in finished:
+                yield items[next_to_yield], finished.pop(next_to_yield)
+                next_to_yield += 1